@@ -0,0 +1,260 @@
+"""
+Замер пропускной способности основного сценария бота: /enter_record -> confirm_command
+(submit_record_command) -> одобрение руководителем (и финансовым отделом для счетов от 50000)
+-> "Оплачено".
+
+Настоящие обработчики из src/main.py получают обновления через Application.process_update,
+запросы к Bot API обрабатывает FakeBotRequest, Google Sheets заменён локальной заглушкой,
+база данных создаётся во временном файле. Для каждого маршрута (до 50000 и от 50000)
+выводятся счета в секунду, p50/p95/p99 времени обработки обновления и запросы к Bot API на счёт.
+
+Запуск из корня репозитория:
+    python -m bench.approval_flow --invoices 200 --api-latency 0.02
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from itertools import count
+
+HEAD_CHAT_ID = 523986696
+FINANCE_CHAT_ID = 236746871
+PAYMENT_CHAT_ID = 455256941
+INITIATOR_CHAT_IDS = [180543030, 113382451, 482546749, 939635840, 594336984]
+
+ROUTES = {"до 50000": 10000, "от 50000": 60000}
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Окружение для Config: выполняется до импорта модулей бота."""
+
+    os.environ.update(
+        {
+            "TELEGRAM_BOT_TOKEN": "123456:bench",
+            "DATABASE_PATH": os.path.join(tempfile.mkdtemp(), "bench.db"),
+            "DATABASE_WRITE_BEHIND": "true" if args.write_behind else "false",
+            "GOOGLE_SHEETS_BACKEND": "fake",
+            "GOOGLE_SHEETS_SPREADSHEET_ID": "bench",
+            "GOOGLE_SHEETS_CREDENTIALS_FILE": "",
+            "GOOGLE_SHEETS_RECORDS_SHEET_ID": "0",
+            "GOOGLE_SHEETS_CATEGORIES_SHEET_ID": "1",
+            "GOOGLE_SHEETS_FAKE_LATENCY": str(args.sheets_latency),
+            "HEAD_CHAT_IDS": str(HEAD_CHAT_ID),
+            "FINANCE_CHAT_IDS": str(FINANCE_CHAT_ID),
+            "PAYMENT_CHAT_IDS": str(PAYMENT_CHAT_ID),
+            "INITIATOR_CHAT_IDS": ",".join(map(str, INITIATOR_CHAT_IDS)),
+            "DEVELOPER_CHAT_ID": "1",
+            "WHITE_LIST": ",".join(
+                map(str, [HEAD_CHAT_ID, FINANCE_CHAT_ID, PAYMENT_CHAT_ID, *INITIATOR_CHAT_IDS])
+            ),
+        }
+    )
+
+
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+class ApprovalFlowBenchmark:
+    """Прогоняет счета через обработчики бота и собирает время обработки обновлений."""
+
+    def __init__(self, application, request):
+        self.application = application
+        self.request = request
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: list[BaseException] = []
+        self._update_ids = count(1)
+        self._message_ids = count(1_000_000)
+        application.add_error_handler(self.record_error)
+
+    async def record_error(self, update, context) -> None:
+        self.errors.append(context.error)
+
+    async def send(self, step: str, update_data: dict) -> None:
+        from telegram import Update
+
+        update = Update.de_json(
+            {"update_id": next(self._update_ids), **update_data}, self.application.bot
+        )
+        started = time.perf_counter()
+        # как в Application.start: через update_processor, с его ограничением и блокировками
+        await self.application.update_processor.process_update(
+            update, self.application.process_update(update)
+        )
+        self.latencies[step].append(time.perf_counter() - started)
+
+    def _message(self, user_id: int, text: str | None = None) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+        }
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [
+                    {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+                ]
+        return message
+
+    async def message(self, step: str, user_id: int, text: str) -> None:
+        await self.send(step, {"message": self._message(user_id, text)})
+
+    async def callback(self, step: str, user_id: int, data: str) -> None:
+        await self.send(
+            step,
+            {
+                "callback_query": {
+                    "id": str(next(self._update_ids)),
+                    "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+                    "chat_instance": "bench",
+                    "message": self._message(user_id),
+                    "data": data,
+                }
+            },
+        )
+
+    async def invoice(self, initiator_id: int, amount: int, label: str) -> None:
+        """Один счёт от /enter_record до оплаты."""
+
+        await self.message("enter_record", initiator_id, "/enter_record")
+        await self.message("input_sum", initiator_id, str(amount))
+        await self.callback("input_item", initiator_id, "0")
+        while True:
+            last_text = self.request.last_text(initiator_id)
+            if last_text.startswith("Выберите группу"):
+                await self.callback("input_group", initiator_id, "0")
+            elif last_text.startswith("Выберите партнёра"):
+                await self.callback("input_partner", initiator_id, "0")
+            else:
+                break
+        await self.message("input_comment", initiator_id, label)
+        await self.message("input_dates", initiator_id, "09.24")
+        await self.callback("input_payment_type", initiator_id, "0")
+        await self.callback("confirm_command", initiator_id, "Подтвердить")
+
+        text = f'"{label}"'
+        data = self.request.find_callback_data(HEAD_CHAT_ID, "approval_approve_head_", text)
+        await self.callback("approval_head", HEAD_CHAT_ID, data)
+        if amount >= 50000:
+            data = self.request.find_callback_data(
+                FINANCE_CHAT_ID, "approval_approve_finance_", text
+            )
+            await self.callback("approval_finance", FINANCE_CHAT_ID, data)
+        data = self.request.find_callback_data(PAYMENT_CHAT_ID, "payment_", text)
+        await self.callback("payment", PAYMENT_CHAT_ID, data)
+
+    async def run_route(self, name: str, amount: int, invoices: int, concurrency: int) -> dict:
+        self.latencies.clear()
+        calls_before = Counter(self.request.calls)
+        errors_before = len(self.errors)
+        numbers = iter(range(invoices))
+        failed = 0
+
+        async def worker(initiator_id: int) -> None:
+            nonlocal failed
+            for number in numbers:
+                try:
+                    await self.invoice(initiator_id, amount, f"bench {name} {number}")
+                except LookupError:
+                    # счёт не дошёл до следующего шага: ошибка обработчика попала в self.errors
+                    failed += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(chat_id) for chat_id in INITIATOR_CHAT_IDS[:concurrency]))
+        elapsed = time.perf_counter() - started
+
+        calls = Counter(self.request.calls)
+        calls.subtract(calls_before)
+        latencies = [value for values in self.latencies.values() for value in values]
+        return {
+            "route": name,
+            "invoices": invoices,
+            "elapsed": elapsed,
+            "errors": len(self.errors) - errors_before,
+            "failed": failed,
+            "latencies": latencies,
+            "steps": {step: list(values) for step, values in self.latencies.items()},
+            "calls": +calls,
+        }
+
+
+def print_report(result: dict) -> None:
+    invoices = result["invoices"]
+    latencies = result["latencies"]
+    print(f"\nМаршрут {result['route']}: {invoices} счетов за {result['elapsed']:.2f} с")
+    print(f"  счетов в секунду: {invoices / result['elapsed']:.1f}")
+    print(
+        f"  время обработки обновления, мс: p50 {percentile(latencies, 50) * 1000:.1f}, "
+        f"p95 {percentile(latencies, 95) * 1000:.1f}, p99 {percentile(latencies, 99) * 1000:.1f}"
+    )
+    print(f"  запросов к Bot API на счёт: {sum(result['calls'].values()) / invoices:.1f}")
+    for endpoint, calls in result["calls"].most_common():
+        print(f"    {endpoint}: {calls / invoices:.1f}")
+    print("  p50 / p99 по шагам, мс:")
+    for step, values in result["steps"].items():
+        print(
+            f"    {step}: {percentile(values, 50) * 1000:.1f} / {percentile(values, 99) * 1000:.1f}"
+        )
+    if result["errors"]:
+        print(f"  ОШИБОК: {result['errors']}, незавершённых счетов: {result['failed']}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    from bench.fake_bot import FakeBotRequest
+    from config.logging_config import logger
+    from src.main import create_application, post_init, post_shutdown
+
+    logger.setLevel(logging.WARNING)
+    request = FakeBotRequest(latency=args.api_latency)
+    application = create_application(request=request, rate_limit=args.rate_limit)
+    benchmark = ApprovalFlowBenchmark(application, request)
+
+    await application.initialize()
+    await post_init(application)
+    try:
+        if args.warmup:
+            await benchmark.run_route("прогрев", 10000, args.warmup, 1)
+        for name, amount in ROUTES.items():
+            print_report(
+                await benchmark.run_route(name, amount, args.invoices, args.concurrency)
+            )
+    finally:
+        await post_shutdown(application)
+        await application.shutdown()
+
+    for error in benchmark.errors[:5]:
+        print(f"Ошибка: {error!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--invoices", type=int, default=100, help="счетов на маршрут")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        choices=range(1, len(INITIATOR_CHAT_IDS) + 1),
+        help="сколько инициаторов вводят счета одновременно",
+    )
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка запроса к Bot API, с")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="задержка запроса к Google Sheets, с")
+    parser.add_argument("--warmup", type=int, default=5, help="счетов для прогрева (не входят в отчёт)")
+    parser.add_argument("--rate-limit", action="store_true", help="включить TelegramRateLimiter")
+    parser.add_argument("--write-behind", action="store_true", help="включить DATABASE_WRITE_BEHIND")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
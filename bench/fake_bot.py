@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from itertools import count
+
+from telegram.request import BaseRequest, RequestData
+
+
+class FakeBotRequest(BaseRequest):
+    """
+    Подмена HTTP-запросов к Bot API: ответы формируются на месте, без сети.
+    Каждый вызов выполняется с задержкой latency секунд и учитывается в calls по методу API.
+    Отправленные и изменённые сообщения сохраняются в sent.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.sent: list[tuple[str, dict]] = []
+        self._message_ids = count(1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData | None = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = self.respond(endpoint, parameters)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def respond(self, endpoint: str, parameters: dict) -> dict | list | bool:
+        if endpoint == "getMe":
+            return {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "bench",
+                "username": "bench_bot",
+            }
+        if endpoint == "getUpdates":
+            return []
+        if endpoint in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            self.sent.append((endpoint, parameters))
+            message_id = parameters.get("message_id") or next(self._message_ids)
+            message = {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(parameters["chat_id"]), "type": "private"},
+                "text": parameters.get("text", ""),
+            }
+            reply_markup = parameters.get("reply_markup")
+            if isinstance(reply_markup, dict) and "inline_keyboard" in reply_markup:
+                message["reply_markup"] = reply_markup
+            return message
+        return True
+
+    def last_text(self, chat_id: int | str) -> str:
+        """Текст последнего отправленного в чат сообщения."""
+        for endpoint, parameters in reversed(self.sent):
+            if endpoint == "sendMessage" and str(parameters["chat_id"]) == str(chat_id):
+                return parameters.get("text", "")
+        return ""
+
+    def find_callback_data(
+        self, chat_id: int | str, prefix: str, text: str = ""
+    ) -> str:
+        """callback_data последней кнопки с префиксом prefix в сообщении, отправленном в чат и содержащем text."""
+        for _, parameters in reversed(self.sent):
+            if str(parameters.get("chat_id")) != str(chat_id):
+                continue
+            if text not in parameters.get("text", ""):
+                continue
+            reply_markup = parameters.get("reply_markup")
+            if not isinstance(reply_markup, dict):
+                continue
+            for row in reply_markup.get("inline_keyboard", []):
+                for button in row:
+                    if button.get("callback_data", "").startswith(prefix):
+                        return button["callback_data"]
+        raise LookupError(f"В чат {chat_id} не отправлялась кнопка {prefix}...")
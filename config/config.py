@@ -11,9 +11,41 @@ class Config:
     telegram_bot_token: str = getenv("TELEGRAM_BOT_TOKEN")
     google_sheets_spreadsheet_id: str = getenv("GOOGLE_SHEETS_SPREADSHEET_ID")
     database_path: str = getenv("DATABASE_PATH")
+    database_write_behind: bool = getenv("DATABASE_WRITE_BEHIND", "false").lower() == "true"
+    database_batch_size: int = int(getenv("DATABASE_BATCH_SIZE", 32))
+    database_max_commit_delay: float = float(getenv("DATABASE_MAX_COMMIT_DELAY", 0.005))
+    message_cache_size: int = int(getenv("MESSAGE_CACHE_SIZE", 500))
+    message_cache_ttl: float = float(getenv("MESSAGE_CACHE_TTL", 24 * 60 * 60))
+    telegram_send_concurrency: int = int(getenv("TELEGRAM_SEND_CONCURRENCY", 8))
+    callback_dedup_cache_size: int = int(getenv("CALLBACK_DEDUP_CACHE_SIZE", 1000))
+    callback_dedup_ttl: float = float(getenv("CALLBACK_DEDUP_TTL", 24 * 60 * 60))
+    telegram_update_mode: str = getenv("TELEGRAM_UPDATE_MODE", "polling")
+    telegram_concurrent_updates: int = int(getenv("TELEGRAM_CONCURRENT_UPDATES", 8))
+    telegram_webhook_url: str | None = getenv("TELEGRAM_WEBHOOK_URL")
+    telegram_webhook_listen: str = getenv("TELEGRAM_WEBHOOK_LISTEN", "0.0.0.0")
+    telegram_webhook_port: int = int(getenv("TELEGRAM_WEBHOOK_PORT", 8080))
+    telegram_webhook_path: str = getenv("TELEGRAM_WEBHOOK_PATH", "/telegram")
+    telegram_webhook_secret_token: str | None = getenv("TELEGRAM_WEBHOOK_SECRET_TOKEN")
+    telegram_webhook_health_path: str = getenv("TELEGRAM_WEBHOOK_HEALTH_PATH", "/health")
     google_sheets_credentials_file: str = getenv("GOOGLE_SHEETS_CREDENTIALS_FILE")
     google_sheets_categories_sheet_id: int = getenv("GOOGLE_SHEETS_CATEGORIES_SHEET_ID")
     google_sheets_records_sheet_id: int = getenv("GOOGLE_SHEETS_RECORDS_SHEET_ID")
+    google_sheets_backend: str = getenv("GOOGLE_SHEETS_BACKEND", "google")
+    google_sheets_fake_path: str | None = getenv("GOOGLE_SHEETS_FAKE_PATH")
+    google_sheets_fake_latency: float = float(getenv("GOOGLE_SHEETS_FAKE_LATENCY", 0))
+    google_sheets_fake_quota_error_rate: float = float(
+        getenv("GOOGLE_SHEETS_FAKE_QUOTA_ERROR_RATE", 0)
+    )
+    google_sheets_format_once: bool = getenv("GOOGLE_SHEETS_FORMAT_ONCE", "false").lower() == "true"
+    google_sheets_categories_refresh_interval: float = float(
+        getenv("GOOGLE_SHEETS_CATEGORIES_REFRESH_INTERVAL", 300)
+    )
+    sheet_outbox_batch_size: int = int(getenv("SHEET_OUTBOX_BATCH_SIZE", 20))
+    sheet_outbox_poll_interval: float = float(getenv("SHEET_OUTBOX_POLL_INTERVAL", 30))
+    sheet_outbox_max_retry_delay: float = float(getenv("SHEET_OUTBOX_MAX_RETRY_DELAY", 600))
+    sheet_outbox_max_attempts: int = int(getenv("SHEET_OUTBOX_MAX_ATTEMPTS", 10))
+    sheet_reconcile_interval: float = float(getenv("SHEET_RECONCILE_INTERVAL", 60 * 60))
+    sheet_reconcile_requeue: bool = getenv("SHEET_RECONCILE_REQUEUE", "false").lower() == "true"
     head_chat_ids: list[int] = list(map(int, getenv("HEAD_CHAT_IDS").split(",")))
     finance_chat_ids: list[int] = list(map(int, getenv("FINANCE_CHAT_IDS").split(",")))
     payment_chat_ids: list[int] = list(map(int, getenv("PAYMENT_CHAT_IDS").split(",")))
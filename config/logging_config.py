@@ -1,17 +1,61 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
 LOG_DIR = "./logs"
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
+LOGGER_NAME = "budget_automation_bot"
 MAX_SIZE = 10 * 1024 * 1024
 MAX_FILES = 5
+LOG_QUEUE_SIZE = 10000
 
 
-def configure_logging(max_bytes=MAX_SIZE, backup_count=MAX_FILES):
-    """Обработчик логгирования в проекте"""
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладёт записи в ограниченную очередь, не блокируясь: если очередь заполнена,
+    запись отбрасывается и учитывается в dropped. О пропущенных записях сообщается
+    предупреждением, как только в очереди снова появится место.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self._unreported:
+                self.queue.put_nowait(self._dropped_record())
+                self._unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+
+    def _dropped_record(self) -> logging.LogRecord:
+        return logging.LogRecord(
+            LOGGER_NAME,
+            logging.WARNING,
+            __file__,
+            0,
+            f"Очередь логов переполнена, пропущено записей: {self._unreported}",
+            None,
+            None,
+        )
+
+
+def configure_logging(max_bytes=MAX_SIZE, backup_count=MAX_FILES, queue_size=LOG_QUEUE_SIZE):
+    """
+    Обработчик логгирования в проекте.
+    Записи передаются через очередь и пишутся в файл и в консоль в отдельном потоке,
+    поэтому логгирование не блокирует цикл событий.
+    """
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+
     # Создаем обработчик файлового логгера
     file_handler = RotatingFileHandler(
         LOG_FILE, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
@@ -19,24 +63,31 @@ def configure_logging(max_bytes=MAX_SIZE, backup_count=MAX_FILES):
     file_handler.setLevel(logging.getLevelName(LOG_LEVEL))
     file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
 
-    # Настраиваем корневой логгер
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.getLevelName(LOG_LEVEL))
-    root_logger.addHandler(file_handler)
-
-    # Создаем потоковый обработчик для консоли
+    # Создаем потоковый обработчик для консоли: только записи глобального логгера
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.getLevelName(LOG_LEVEL))
     console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    console_handler.addFilter(logging.Filter(LOGGER_NAME))
+
+    # Обработчики работают в потоке QueueListener, логгеры только кладут записи в очередь
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Настраиваем корневой логгер
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.getLevelName(LOG_LEVEL))
+    root_logger.addHandler(queue_handler)
 
     # Создаем глобальный логгер
-    logger = logging.getLogger("budget_automation_bot")
+    logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(logging.getLevelName(LOG_LEVEL))
-    logger.addHandler(console_handler)
-
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
-    return logger
+    return logger, queue_handler
 
 
-logger = configure_logging()
+logger, log_queue_handler = configure_logging()
@@ -1,145 +1,562 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
 import aiosqlite
 
 from config.config import Config
 from config.logging_config import logger
+from db.migrations import MIGRATIONS, OPEN_STATUSES_CONDITION
+
+# Настройки соединения на запись: WAL позволяет читать параллельно с записью,
+# synchronous=NORMAL в режиме WAL не теряет целостность при сбое процесса.
+WRITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# Настройки соединения только на чтение
+READ_PRAGMAS = {
+    "cache_size": -16000,
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+# Операция записи: получает соединение на запись и выполняет запросы без фиксации транзакции
+WriteOperation = Callable[[aiosqlite.Connection], Awaitable[any]]
+
+_STOP_WRITER = object()
+
+# Неоплаченные счета ищутся по частичному индексу idx_approvals_open. Условие id > 0
+# (id всегда положительны) нужно для подсчёта: без статистики ANALYZE планировщик
+# выбирает для COUNT(*) полный просмотр idx_approvals_status.
+COUNT_NOT_PAID_QUERY = f"SELECT COUNT(*) FROM approvals WHERE {OPEN_STATUSES_CONDITION} AND id > 0"
+NOT_PAID_NEXT_QUERY = (
+    f"SELECT * FROM approvals WHERE {OPEN_STATUSES_CONDITION} AND id > ? ORDER BY id LIMIT ?"
+)
+NOT_PAID_PREVIOUS_QUERY = (
+    f"SELECT * FROM approvals WHERE {OPEN_STATUSES_CONDITION} AND id < ? ORDER BY id DESC LIMIT ?"
+)
+
+APPROVAL_COLUMNS = (
+    "id",
+    "amount",
+    "expense_item",
+    "expense_group",
+    "partner",
+    "comment",
+    "period",
+    "payment_method",
+    "approvals_needed",
+    "approvals_received",
+    "status",
+    "approved_by",
+    "initiator_id",
+)
 
 
 class ApprovalDB:
-    """База данных для хранения данных о заявке"""
+    """База данных для хранения данных о заявке.
 
-    def __init__(self):
+    Держит одно соединение на запись и одно соединение только на чтение на всё время
+    работы приложения. Соединения открываются методом connect() (в Application.post_init)
+    и закрываются методом close() при остановке бота.
+
+    В режиме write_behind все изменения передаются в очередь одной фоновой задаче, которая
+    фиксирует их пачками: не более batch_size операций и не дольше max_commit_delay секунд
+    ожидания. Вызывающий код получает результат только после фиксации своей пачки.
+    """
+
+    def __init__(
+        self,
+        write_behind: bool = Config.database_write_behind,
+        batch_size: int = Config.database_batch_size,
+        max_commit_delay: float = Config.database_max_commit_delay,
+    ):
         self.db_file = Config.database_path
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.max_commit_delay = max_commit_delay
+        self._conn: aiosqlite.Connection | None = None
+        self._read_conn: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._write_queue: asyncio.Queue | None = None
+        self._writer_task: asyncio.Task | None = None
+
+    async def connect(self) -> None:
+        """Открывает общие соединения с базой данных, если они ещё не открыты."""
+        if self._conn is not None:
+            return
 
-    async def __aenter__(self) -> "ApprovalDB":
         self._conn = await aiosqlite.connect(self.db_file)
-        self._cursor = await self._conn.cursor()
+        await self._apply_pragmas(self._conn, WRITE_PRAGMAS)
+
+        read_uri = f"{Path(self.db_file).resolve().as_uri()}?mode=ro"
+        self._read_conn = await aiosqlite.connect(read_uri, uri=True)
+        await self._apply_pragmas(self._read_conn, READ_PRAGMAS)
+
+        if self.write_behind:
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer())
         logger.info("Соединение установлено.")
+
+    async def close(self) -> None:
+        """Фиксирует оставшиеся в очереди изменения и закрывает соединения с базой данных."""
+        if self._writer_task is not None:
+            await self._write_queue.put(_STOP_WRITER)
+            await self._writer_task
+            self._write_queue = self._writer_task = None
+
+        for conn in (self._read_conn, self._conn):
+            if conn is not None:
+                await conn.close()
+        self._conn = self._read_conn = None
+        logger.info("Соединение разъединено.")
+
+    @staticmethod
+    async def _apply_pragmas(conn: aiosqlite.Connection, pragmas: dict[str, any]) -> None:
+        for name, value in pragmas.items():
+            await conn.execute(f"PRAGMA {name} = {value};")
+
+    async def _write(self, operation: WriteOperation) -> any:
+        """Выполняет операцию записи и возвращает её результат после фиксации транзакции."""
+        future = asyncio.get_running_loop().create_future()
+        if self._write_queue is None:
+            async with self._write_lock:
+                await self._commit_batch([(operation, future)])
+        else:
+            await self._write_queue.put((operation, future))
+        return await future
+
+    async def _writer(self) -> None:
+        """Фоновая задача: забирает операции из очереди и фиксирует их пачками."""
+        loop = asyncio.get_running_loop()
+        stop = False
+        while not stop:
+            item = await self._write_queue.get()
+            if item is _STOP_WRITER:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_commit_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(
+                        self._write_queue.get(), max(deadline - loop.time(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP_WRITER:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                async with self._write_lock:
+                    await self._commit_batch(batch)
+            except Exception as e:
+                # ошибка ROLLBACK или закрытое соединение не должны останавливать фоновую задачу
+                logger.error(f"Ошибка фиксации пачки изменений в базе данных: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _commit_batch(
+        self, batch: list[tuple[WriteOperation, asyncio.Future]]
+    ) -> None:
+        """Выполняет пачку операций в одной транзакции.
+
+        Каждая операция выполняется в своей точке сохранения, поэтому ошибка в одной
+        операции откатывает только её. Результаты передаются вызывающему коду после COMMIT.
+        """
+        results = []
+        try:
+            await self._conn.execute("BEGIN")
+            for operation, future in batch:
+                await self._conn.execute("SAVEPOINT write_operation")
+                try:
+                    result = await operation(self._conn)
+                except Exception as e:
+                    await self._conn.execute("ROLLBACK TO write_operation")
+                    results.append((future, None, e))
+                else:
+                    results.append((future, result, None))
+                await self._conn.execute("RELEASE write_operation")
+            await self._conn.commit()
+        except Exception as e:
+            logger.error(f"Не удалось зафиксировать изменения в базе данных: {e}")
+            await self._conn.rollback()
+            results = [(future, None, e) for _, future in batch]
+
+        for future, result, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def __aenter__(self) -> "ApprovalDB":
+        await self.connect()
         return self
 
     async def __aexit__(self, exc_type: any, exc_val: any, exc_tb: any) -> bool:
         if exc_type:
             logger.error(f"Произошла ошибка: {exc_type}; {exc_val}; {exc_tb}")
-        if self._conn:
-            await self._conn.close()
-            logger.info("Соединение разъединено.")
         return True
 
-    async def create_table(self) -> None:
-        """Создает таблицу 'approvals', если она еще не существует."""
-        async with self:
-            await self._cursor.execute(
-                'SELECT name FROM sqlite_master WHERE type="table" AND name="approvals";'
-            )
-            table_exists = await self._cursor.fetchone()
+    async def migrate(self) -> None:
+        """Приводит схему базы данных к последней версии из MIGRATIONS."""
+        await self.connect()
+        async with self._conn.execute("PRAGMA user_version;") as cursor:
+            (version,) = await cursor.fetchone()
+
+        if version >= len(MIGRATIONS):
+            logger.info(f"Схема базы данных актуальна (версия {version}).")
+            return
 
-            if not table_exists:
+        async with self._write_lock:
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
                 try:
-                    await self._cursor.execute(
-                        """CREATE TABLE IF NOT EXISTS approvals
-                                                  (id INTEGER PRIMARY KEY, 
-                                                   amount REAL, 
-                                                   expense_item TEXT, 
-                                                   expense_group TEXT, 
-                                                   partner TEXT, 
-                                                   comment TEXT,
-                                                   period TEXT, 
-                                                   payment_method TEXT, 
-                                                   approvals_needed INTEGER, 
-                                                   approvals_received INTEGER,
-                                                   status TEXT,
-                                                   approved_by TEXT,
-                                                   initiator_id INTEGER)"""
-                    )
+                    await self._conn.execute("BEGIN")
+                    for statement in statements:
+                        await self._conn.execute(statement)
+                    await self._conn.execute(f"PRAGMA user_version = {number};")
                     await self._conn.commit()
-                    logger.info('Таблица "approvals" создана.')
+                    logger.info(f"Применена миграция базы данных №{number}.")
                 except Exception as e:
-                    raise RuntimeError(e)
-            else:
-                logger.info('Таблица "approvals" уже существует.')
+                    await self._conn.rollback()
+                    raise RuntimeError(f"Не удалось применить миграцию №{number}: {e}")
 
     async def insert_record(self, record_dict: dict[str, any]) -> int:
         """
         Добавляет новую запись в таблицу 'approvals'.
         """
 
-        try:
-            await self._cursor.execute(
-                "INSERT INTO approvals (amount, expense_item, expense_group, partner, comment, period, payment_method,"
-                "approvals_needed, approvals_received, status, approved_by, initiator_id) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+        async def insert(conn: aiosqlite.Connection) -> int:
+            async with conn.execute(
+                "INSERT INTO approvals (amount, expense_item, expense_group, partner, comment, "
+                "period, payment_method, approvals_needed, approvals_received, status, approved_by, "
+                "initiator_id) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
                 list(record_dict.values()),
-            )
-            await self._conn.commit()
+            ) as cursor:
+                return cursor.lastrowid
+
+        try:
+            row_id = await self._write(insert)
             logger.info("Информация о счёте успешно добавлена.")
-            return self._cursor.lastrowid
+            return row_id
         except Exception as e:
             raise RuntimeError(f"Не удалось добавить информацию о счёте: {e}")
 
     async def get_row_by_id(self, row_id: int) -> dict[str, any] | None:
         """Получаем словарь из названий и значений столбцов по id"""
         try:
-            result = await self._cursor.execute(
+            async with self._read_conn.execute(
                 "SELECT * FROM approvals WHERE id=?", (row_id,)
-            )
-            row = await result.fetchone()
+            ) as cursor:
+                row = await cursor.fetchone()
             if row is None:
                 raise RuntimeError(f"По заданному id: {row_id} данных не найдено!")
             logger.info("Данные строки получены успешно.")
-            return dict(
-                zip(
-                    (
-                        "id",
-                        "amount",
-                        "expense_item",
-                        "expense_group",
-                        "partner",
-                        "comment",
-                        "period",
-                        "payment_method",
-                        "approvals_needed",
-                        "approvals_received",
-                        "status",
-                        "approved_by",
-                        "initiator_id",
-                    ),
-                    row,
+            return dict(zip(APPROVAL_COLUMNS, row))
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить запись: {e}")
+
+    async def transition(
+        self,
+        row_id: int,
+        expected_status: str | tuple[str, ...],
+        new_status: str,
+        approver: str | None = None,
+        approvals_received: int | None = None,
+        department: str | None = None,
+        chat_id: int | None = None,
+        decision: str | None = None,
+        export_to_sheet: bool = False,
+    ) -> dict[str, any] | None:
+        """Атомарно переводит счёт из статуса expected_status в статус new_status.
+
+        Одобривший дописывается в столбец approved_by через " и ". Если передан decision,
+        в той же транзакции в таблицу 'approval_decisions' добавляется решение сотрудника
+        chat_id из отдела department, а при export_to_sheet=True счёт ставится в очередь
+        выгрузки в Google Sheets ('sheet_outbox'). Возвращает обновлённую строку или None,
+        если счёт уже не находится в ожидаемом статусе (переход выполнен другим запросом).
+        """
+        if isinstance(expected_status, str):
+            expected_status = (expected_status,)
+        expected = {f"expected_{i}": status for i, status in enumerate(expected_status)}
+        placeholders = ", ".join(f":{key}" for key in expected)
+
+        async def update(conn: aiosqlite.Connection) -> tuple | None:
+            async with conn.execute(
+                f"""UPDATE approvals
+                    SET status = :new_status,
+                        approved_by = CASE
+                            WHEN :approver IS NULL THEN approved_by
+                            WHEN approved_by IS NULL OR approved_by = '' THEN :approver
+                            ELSE approved_by || ' и ' || :approver
+                        END,
+                        approvals_received = COALESCE(:approvals_received, approvals_received)
+                    WHERE id = :row_id AND status IN ({placeholders})""",
+                {
+                    "new_status": new_status,
+                    "approver": approver,
+                    "approvals_received": approvals_received,
+                    "row_id": row_id,
+                    **expected,
+                },
+            ) as cursor:
+                updated = cursor.rowcount
+            if not updated:
+                return None
+            # без UPDATE ... RETURNING: он требует SQLite 3.35+, а в образе bullseye SQLite 3.34
+            async with conn.execute("SELECT * FROM approvals WHERE id=?", (row_id,)) as cursor:
+                row = await cursor.fetchone()
+
+            if row is not None and decision is not None:
+                await conn.execute(
+                    "INSERT INTO approval_decisions (row_id, department, chat_id, decision) VALUES (?,?,?,?)",
+                    (row_id, department, chat_id, decision),
                 )
+            if row is not None and export_to_sheet:
+                await conn.execute(
+                    "INSERT OR IGNORE INTO sheet_outbox (row_id) VALUES (?)", (row_id,)
+                )
+            return row
+
+        try:
+            row = await self._write(update)
+        except Exception as e:
+            raise RuntimeError(
+                f"Не удалось изменить статус счёта: {e}. ID заявки: {row_id}, "
+                f"Новый статус: {new_status}"
             )
+
+        if row is None:
+            logger.info(f"Счёт №{row_id} уже не в статусе {expected_status}.")
+            return None
+        logger.info(f"Статус счёта №{row_id} изменён на {new_status}.")
+        return dict(zip(APPROVAL_COLUMNS, row))
+
+    async def get_decision_chat_ids(self, row_id: int, department: str) -> list[int]:
+        """Возвращает chat_id сотрудников отдела, принимавших решения по счёту."""
+        try:
+            async with self._read_conn.execute(
+                "SELECT DISTINCT chat_id FROM approval_decisions WHERE row_id=? AND department=?",
+                (row_id, department),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [chat_id for (chat_id,) in rows]
         except Exception as e:
-            raise RuntimeError(f"Не удалось получить запись: {e}")
+            raise RuntimeError(f"Не удалось получить решения по счёту: {e}")
+
+    async def get_sheet_outbox(self, limit: int) -> list[dict[str, any]]:
+        """
+        Возвращает до limit счетов из очереди выгрузки в Google Sheets, время повтора которых наступило.
+        Счета, выгрузка которых прекращена, не возвращаются.
+        """
+        columns = ", ".join(f"approvals.{column}" for column in APPROVAL_COLUMNS)
+        try:
+            async with self._read_conn.execute(
+                f"""SELECT {columns}, sheet_outbox.attempts
+                    FROM sheet_outbox JOIN approvals ON approvals.id = sheet_outbox.row_id
+                    WHERE sheet_outbox.failed_at IS NULL
+                      AND sheet_outbox.next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY sheet_outbox.created_at, sheet_outbox.row_id
+                    LIMIT ?""",
+                (limit,),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [dict(zip(APPROVAL_COLUMNS + ("attempts",), row)) for row in rows]
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить очередь выгрузки в таблицу: {e}")
+
+    async def delete_from_sheet_outbox(self, row_ids: list[int]) -> None:
+        """Удаляет выгруженные счета из очереди выгрузки в Google Sheets."""
+
+        async def delete(conn: aiosqlite.Connection) -> None:
+            await conn.executemany(
+                "DELETE FROM sheet_outbox WHERE row_id=?", [(row_id,) for row_id in row_ids]
+            )
+
+        try:
+            await self._write(delete)
+        except Exception as e:
+            raise RuntimeError(f"Не удалось удалить счета из очереди выгрузки: {e}")
+
+    async def postpone_sheet_outbox(
+        self, row_ids: list[int], delay: float, error: str
+    ) -> None:
+        """Откладывает повторную выгрузку счетов на delay секунд и сохраняет текст ошибки."""
+
+        async def postpone(conn: aiosqlite.Connection) -> None:
+            await conn.executemany(
+                "UPDATE sheet_outbox SET attempts = attempts + 1, last_error = ?, "
+                "next_attempt_at = datetime('now', ?) WHERE row_id=?",
+                [(error, f"+{delay} seconds", row_id) for row_id in row_ids],
+            )
 
-    async def get_column_by_id(self, column_name: str, row_id: int) -> any:
-        """Получает значение указанного столбца по id"""
         try:
-            result = await self._cursor.execute(
-                f"SELECT [{column_name}] FROM approvals WHERE id=?", (row_id,)
+            await self._write(postpone)
+        except Exception as e:
+            raise RuntimeError(f"Не удалось отложить выгрузку счетов: {e}")
+
+    async def fail_sheet_outbox(self, row_ids: list[int], error: str) -> None:
+        """Прекращает выгрузку счетов: они остаются в очереди с отметкой failed_at и текстом ошибки."""
+
+        async def fail(conn: aiosqlite.Connection) -> None:
+            await conn.executemany(
+                "UPDATE sheet_outbox SET attempts = attempts + 1, last_error = ?, "
+                "failed_at = CURRENT_TIMESTAMP WHERE row_id=?",
+                [(error, row_id) for row_id in row_ids],
             )
-            value = await result.fetchone()
-            if value is None:
-                return None
-            logger.info(f"Значение столбца '{column_name}' получено успешно.")
-            return value[0]
+
+        try:
+            await self._write(fail)
         except Exception as e:
-            raise RuntimeError(f"Не удалось получить значение столбца: {e}")
+            raise RuntimeError(f"Не удалось прекратить выгрузку счетов: {e}")
 
-    async def update_row_by_id(self, row_id: int, updates: dict[str, any]) -> None:
-        """Функция меняет значения столбцов.
-        :param принимает id строки row_id и словарь updates из названий и значений столбцов
+    async def get_sheet_outbox_stats(self) -> dict[str, any]:
+        """
+        Возвращает размер очереди выгрузки в Google Sheets, возраст самой старой записи в секундах
+        и количество счетов, выгрузка которых прекращена.
         """
         try:
-            await self._cursor.execute(
-                "UPDATE approvals SET {} WHERE id = ?".format(
-                    ", ".join([f"{key} = ?" for key in updates.keys()])
-                ),
-                list(updates.values()) + [row_id],
+            async with self._read_conn.execute(
+                """SELECT COUNT(*) FILTER (WHERE failed_at IS NULL),
+                          (julianday('now') - julianday(MIN(created_at) FILTER (WHERE failed_at IS NULL))) * 86400,
+                          COUNT(*) FILTER (WHERE failed_at IS NOT NULL)
+                   FROM sheet_outbox"""
+            ) as cursor:
+                depth, oldest_age, failed = await cursor.fetchone()
+            return {"depth": depth, "oldest_age": oldest_age, "failed": failed}
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить состояние очереди выгрузки: {e}")
+
+    async def enqueue_sheet_export(self, row_ids: list[int]) -> None:
+        """Ставит счета в очередь выгрузки в Google Sheets (повторно поставленные счета игнорируются)."""
+
+        async def enqueue(conn: aiosqlite.Connection) -> None:
+            await conn.executemany(
+                "INSERT OR IGNORE INTO sheet_outbox (row_id) VALUES (?)",
+                [(row_id,) for row_id in row_ids],
             )
-            await self._conn.commit()
-            logger.info("Информация о счёте успешно обновлена.")
+
+        try:
+            await self._write(enqueue)
         except Exception as e:
-            raise RuntimeError(
-                f"Не удалось обновить информацию о счёте: {e}. ID заявки: {row_id}, "
-                f"Обновления: {updates}"
+            raise RuntimeError(f"Не удалось поставить счета в очередь выгрузки: {e}")
+
+    async def get_sheet_outbox_row_ids(self) -> set[int]:
+        """Возвращает id счетов в очереди выгрузки в Google Sheets, кроме счетов, выгрузка которых прекращена."""
+        try:
+            async with self._read_conn.execute(
+                "SELECT row_id FROM sheet_outbox WHERE failed_at IS NULL"
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return {row_id for (row_id,) in rows}
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить очередь выгрузки в таблицу: {e}")
+
+    async def get_paid_decisions(self, after_id: int) -> list[tuple[int, int]]:
+        """Возвращает решения об оплате с id больше after_id в виде [(id решения, id счёта)]."""
+        try:
+            async with self._read_conn.execute(
+                "SELECT id, row_id FROM approval_decisions WHERE decision='paid' AND id > ? ORDER BY id",
+                (after_id,),
+            ) as cursor:
+                return list(await cursor.fetchall())
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить решения об оплате: {e}")
+
+    async def get_max_decision_id(self) -> int:
+        """Возвращает id последнего решения по счетам (0, если решений нет)."""
+        try:
+            async with self._read_conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM approval_decisions"
+            ) as cursor:
+                (max_id,) = await cursor.fetchone()
+            return max_id
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить последнее решение по счетам: {e}")
+
+    async def get_meta(self, *keys: str) -> dict[str, int]:
+        """Возвращает служебные значения по ключам; отсутствующие ключи не попадают в результат."""
+        placeholders = ", ".join("?" for _ in keys)
+        try:
+            async with self._read_conn.execute(
+                f"SELECT key, value FROM meta WHERE key IN ({placeholders})", keys
+            ) as cursor:
+                return dict(await cursor.fetchall())
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить служебные значения: {e}")
+
+    async def set_meta(self, values: dict[str, int]) -> None:
+        """Сохраняет служебные значения в одной транзакции."""
+
+        async def save(conn: aiosqlite.Connection) -> None:
+            await conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items()
+            )
+
+        try:
+            await self._write(save)
+        except Exception as e:
+            raise RuntimeError(f"Не удалось сохранить служебные значения: {e}")
+
+    async def get_tracked_messages(self, row_id: int) -> dict[str, list[tuple[int, int]]]:
+        """Возвращает отправленные по счёту сообщения в виде {отдел: [(chat_id, message_id)]}"""
+        try:
+            async with self._read_conn.execute(
+                "SELECT department, chat_id, message_id FROM tracked_messages WHERE row_id=?",
+                (row_id,),
+            ) as cursor:
+                rows = await cursor.fetchall()
+        except Exception as e:
+            raise RuntimeError(f"Не удалось получить сообщения по счёту: {e}")
+
+        tracked_messages = {}
+        for department, chat_id, message_id in rows:
+            tracked_messages.setdefault(department, []).append((chat_id, message_id))
+        return tracked_messages
+
+    async def save_tracked_messages(
+        self, row_id: int, department: str, messages: list[tuple[int, int]]
+    ) -> None:
+        """Заменяет сохранённые сообщения отдела по счёту на messages."""
+
+        async def save(conn: aiosqlite.Connection) -> None:
+            await conn.execute(
+                "DELETE FROM tracked_messages WHERE row_id=? AND department=?",
+                (row_id, department),
+            )
+            await conn.executemany(
+                "INSERT OR REPLACE INTO tracked_messages (row_id, department, chat_id, message_id) VALUES (?,?,?,?)",
+                [(row_id, department, chat_id, message_id) for chat_id, message_id in messages],
             )
 
+        try:
+            await self._write(save)
+        except Exception as e:
+            raise RuntimeError(f"Не удалось сохранить сообщения по счёту: {e}")
+
+    async def delete_tracked_messages(self, row_id: int) -> None:
+        """Удаляет сохранённые сообщения по счёту."""
+
+        async def delete(conn: aiosqlite.Connection) -> None:
+            await conn.execute("DELETE FROM tracked_messages WHERE row_id=?", (row_id,))
+
+        try:
+            await self._write(delete)
+        except Exception as e:
+            raise RuntimeError(f"Не удалось удалить сообщения по счёту: {e}")
+
     async def get_record_info(self, row_id: int) -> str:
         """
         Получает детали конкретного счета из базы данных и форматирует их для бота.
@@ -165,16 +582,30 @@ class ApprovalDB:
             logger.error(f"Ошибка при получении деталей счета: {str(e)}")
             raise RuntimeError(f"Произошла ошибка: {str(e)}")
 
-    async def find_not_paid(self) -> list[dict[str, str]]:
-        """Функция возвращает все данные по всем неоплаченным заявкам на платёж"""
+    async def count_not_paid(self) -> int:
+        """Возвращает количество неоплаченных заявок на платёж"""
         try:
-            result = await self._cursor.execute(
-                "SELECT * FROM approvals WHERE status != ? AND status != ?",
-                ("Paid", "Rejected"),
-            )
-            rows = await result.fetchall()
+            async with self._read_conn.execute(COUNT_NOT_PAID_QUERY) as cursor:
+                (count,) = await cursor.fetchone()
+            return count
+        except Exception as e:
+            raise RuntimeError(f"Не удалось посчитать неоплаченные счета: {e}")
+
+    async def find_not_paid(
+        self, cursor_id: int = 0, forward: bool = True, limit: int = -1
+    ) -> list[dict[str, str]]:
+        """
+        Функция возвращает страницу неоплаченных заявок на платёж, упорядоченных по id.
+        При forward=True возвращаются заявки с id больше cursor_id, иначе - с id меньше cursor_id.
+        """
+        query = NOT_PAID_NEXT_QUERY if forward else NOT_PAID_PREVIOUS_QUERY
+        try:
+            async with self._read_conn.execute(query, (cursor_id, limit)) as cursor:
+                rows = await cursor.fetchall()
             if not rows:
                 return []
+            if not forward:
+                rows.reverse()
             logger.info("Неоплаченные счета найдены успешно.")
 
             return [
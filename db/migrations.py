@@ -0,0 +1,71 @@
+# Миграции схемы базы данных.
+# Номер миграции - её позиция в списке MIGRATIONS (начиная с 1). Применённая версия
+# хранится в PRAGMA user_version, поэтому новые миграции добавляются только в конец списка,
+# а уже выпущенные не изменяются.
+
+OPEN_STATUSES_CONDITION = "status NOT IN ('Paid', 'Rejected')"
+
+MIGRATIONS: list[tuple[str, ...]] = [
+    # 1: исходная таблица заявок
+    (
+        """CREATE TABLE IF NOT EXISTS approvals
+                                  (id INTEGER PRIMARY KEY,
+                                   amount REAL,
+                                   expense_item TEXT,
+                                   expense_group TEXT,
+                                   partner TEXT,
+                                   comment TEXT,
+                                   period TEXT,
+                                   payment_method TEXT,
+                                   approvals_needed INTEGER,
+                                   approvals_received INTEGER,
+                                   status TEXT,
+                                   approved_by TEXT,
+                                   initiator_id INTEGER)""",
+    ),
+    # 2: индексы для поиска неоплаченных счетов, по статусу и по инициатору
+    (
+        f"CREATE INDEX IF NOT EXISTS idx_approvals_open ON approvals (id) WHERE {OPEN_STATUSES_CONDITION}",
+        "CREATE INDEX IF NOT EXISTS idx_approvals_status ON approvals (status)",
+        "CREATE INDEX IF NOT EXISTS idx_approvals_initiator_id ON approvals (initiator_id)",
+    ),
+    # 3: решения по счетам: одна строка на каждое решение сотрудника отдела
+    (
+        """CREATE TABLE IF NOT EXISTS approval_decisions
+                                  (id INTEGER PRIMARY KEY,
+                                   row_id INTEGER NOT NULL REFERENCES approvals (id),
+                                   department TEXT NOT NULL,
+                                   chat_id INTEGER NOT NULL,
+                                   decision TEXT NOT NULL,
+                                   created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)""",
+        "CREATE INDEX IF NOT EXISTS idx_approval_decisions_row_id ON approval_decisions (row_id, department)",
+    ),
+    # 4: отправленные ботом сообщения по счетам (состояние MessageManager)
+    (
+        """CREATE TABLE IF NOT EXISTS tracked_messages
+                                  (row_id INTEGER NOT NULL,
+                                   department TEXT NOT NULL,
+                                   chat_id INTEGER NOT NULL,
+                                   message_id INTEGER NOT NULL,
+                                   PRIMARY KEY (row_id, department, chat_id)) WITHOUT ROWID""",
+    ),
+    # 5: очередь выгрузки оплаченных счетов в Google Sheets
+    (
+        """CREATE TABLE IF NOT EXISTS sheet_outbox
+                                  (row_id INTEGER PRIMARY KEY REFERENCES approvals (id),
+                                   created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                                   attempts INTEGER NOT NULL DEFAULT 0,
+                                   next_attempt_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                                   last_error TEXT)""",
+    ),
+    # 6: служебные значения (отметки сверки базы данных с Google Sheets)
+    (
+        """CREATE TABLE IF NOT EXISTS meta
+                                  (key TEXT PRIMARY KEY,
+                                   value INTEGER NOT NULL) WITHOUT ROWID""",
+    ),
+    # 7: счета, выгрузка которых прекращена после sheet_outbox_max_attempts неудачных попыток
+    (
+        "ALTER TABLE sheet_outbox ADD COLUMN failed_at TEXT",
+    ),
+]
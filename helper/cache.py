@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Словарь ограниченного размера с вытеснением записей.
+    Запись вытесняется, если к ней не обращались дольше ttl секунд
+    или если в кэше больше maxsize записей (вытесняется давно не использованная).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        self.expire()
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        self.expire()
+        return key in self._data
+
+    def __getitem__(self, key):
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        self.expire()
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __delitem__(self, key) -> None:
+        del self._data[key]
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу и продлевает время жизни записи."""
+        self.expire()
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data[key] = (item[0], time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        return item[0]
+
+    def setdefault(self, key, default=None):
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            self[key] = value = default
+        return value
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def expire(self) -> None:
+        """Удаляет просроченные записи. Записи упорядочены по времени последнего обращения."""
+        now = time.monotonic()
+        while self._data:
+            _, expires_at = next(iter(self._data.values()))
+            if expires_at > now:
+                break
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики попаданий, промахов и вытеснений."""
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
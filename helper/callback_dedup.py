@@ -0,0 +1,52 @@
+from collections.abc import Hashable, Iterator
+from contextlib import contextmanager
+
+from config.config import Config
+from helper.cache import TTLCache
+
+
+class CallbackDeduplicator:
+    """
+    Отсеивает повторные нажатия кнопок и повторную доставку одного обновления.
+
+    Нажатие считается повтором, если уже обработан callback_query с тем же id
+    или то же действие над счётом - ключ (row_id, действие, отдел). Обработанные ключи
+    хранятся в TTLCache ограниченного размера; при ошибке обработки ключи снимаются,
+    чтобы нажатие можно было повторить.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = Config.callback_dedup_cache_size,
+        ttl: float = Config.callback_dedup_ttl,
+    ):
+        self._processed = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _keys(query_id: str, action_key: tuple) -> tuple[Hashable, Hashable]:
+        return ("query", query_id), ("action", *action_key)
+
+    def claim(self, query_id: str, action_key: tuple) -> bool:
+        """Отмечает нажатие как обрабатываемое. Возвращает False, если это повтор."""
+        keys = self._keys(query_id, action_key)
+        if any(key in self._processed for key in keys):
+            return False
+        for key in keys:
+            self._processed[key] = True
+        return True
+
+    def release(self, query_id: str, action_key: tuple) -> None:
+        """Снимает отметку, чтобы нажатие можно было обработать снова."""
+        for key in self._keys(query_id, action_key):
+            self._processed.pop(key)
+
+    @contextmanager
+    def release_on_error(self, query_id: str, action_key: tuple) -> Iterator[None]:
+        try:
+            yield
+        except BaseException:
+            self.release(query_id, action_key)
+            raise
+
+
+callback_deduplicator = CallbackDeduplicator()
@@ -1,15 +1,27 @@
+import asyncio
+from collections.abc import Awaitable, Iterable
+
 from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
+from config.config import Config
 from config.logging_config import logger
 from db import db
 
-from helper.messages import INITIATOR, HEAD, FINANCE, PAYMENT
-from helper.user_data import get_chat_ids, get_department
+from helper.cache import TTLCache
+from helper.messages import INITIATOR, HEAD, FINANCE, PAYMENT, RESEND_STAGES
+from helper.user_data import get_chat_ids, get_department, get_nickname
+from helper.utils import get_record_info
 
 
 class MessageManager:
-    """Класс для хранения данных и отправки сообщений по отделам"""
+    """Класс для хранения данных и отправки сообщений по отделам.
+
+    Отправленные сообщения сохраняются в таблицу 'tracked_messages', а в памяти хранится
+    только кэш данных по счетам ограниченного размера. После перезапуска бота или вытеснения
+    из кэша данные счёта восстанавливаются методом load() из базы данных.
+    """
 
     _instance = None
 
@@ -20,7 +32,9 @@ class MessageManager:
         return cls._instance
 
     def _initialize(self):
-        self._data = {}
+        self._data = TTLCache(
+            maxsize=Config.message_cache_size, ttl=Config.message_cache_ttl
+        )
         self.db = db
         self.messages = {
             "initiator": INITIATOR,
@@ -62,6 +76,57 @@ class MessageManager:
         """Обновляет данные ячейки по ID."""
         self._data.setdefault(row_id, {}).update(data_dict)
 
+    async def load(self, row_id: int) -> dict:
+        """Возвращает данные счёта, при отсутствии в памяти восстанавливая их из базы данных."""
+        cached = self._data.get(row_id)
+        if cached is not None and "record_data_text" in cached:
+            return cached
+
+        try:
+            record_dict = await self.db.get_row_by_id(row_id)
+            tracked_messages = await self.db.get_tracked_messages(row_id)
+        except Exception as e:
+            logger.error(f"Не удалось восстановить данные счёта №{row_id}: {e}")
+            return {}
+
+        initiator_chat_id = record_dict["initiator_id"]
+        data = {
+            "initiator_chat_id": initiator_chat_id,
+            "initiator_nickname": await get_nickname("initiator", initiator_chat_id),
+            "record_data_text": await get_record_info(record_dict),
+            "amount": record_dict["amount"],
+        }
+        if record_dict["approved_by"]:
+            data["approver"] = record_dict["approved_by"]
+        for department, messages in tracked_messages.items():
+            data[f"{department}_messages"] = messages
+
+        # данные, добавленные в кэш до загрузки, новее данных из базы
+        self._data[row_id] = data = {**data, **(cached or {})}
+        return data
+
+    def cache_stats(self) -> dict[str, int]:
+        """Возвращает счётчики попаданий, промахов и вытеснений кэша данных счетов."""
+        return self._data.stats()
+
+    async def set_messages(
+        self, row_id: int, department: str, messages: list[tuple[int, int]]
+    ) -> None:
+        """Сохраняет отправленные отделу сообщения в памяти и в базе данных."""
+        await self.update_data(row_id, {f"{department}_messages": messages})
+        try:
+            await self.db.save_tracked_messages(row_id, department, messages)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения сообщений счёта №{row_id}: {e}")
+
+    async def remove(self, row_id: int) -> None:
+        """Удаляет данные счёта из памяти и из базы данных."""
+        self._data.pop(row_id, None)
+        try:
+            await self.db.delete_tracked_messages(row_id)
+        except Exception as e:
+            logger.error(f"Ошибка удаления сообщений счёта №{row_id}: {e}")
+
     async def get_message(self, department, stage, **kwargs) -> str:
         if department not in self.messages:
             raise ValueError(f"Неправильный департамент: {department}")
@@ -76,6 +141,22 @@ class MessageManager:
             raise ValueError(f"Ошибка при форматировании сообщения: {e}")
 
 
+    async def _gather_limited(self, coroutines: Iterable[Awaitable]) -> list:
+        """
+        Выполняет запросы параллельно, но не более Config.telegram_send_concurrency одновременно.
+        Результаты возвращаются в исходном порядке; ошибка запроса возвращается вместо его
+        результата и не отменяет остальные запросы.
+        """
+        semaphore = asyncio.Semaphore(Config.telegram_send_concurrency)
+
+        async def run(coroutine: Awaitable):
+            async with semaphore:
+                return await coroutine
+
+        return await asyncio.gather(
+            *(run(coroutine) for coroutine in coroutines), return_exceptions=True
+        )
+
     async def send_messages_with_tracking(
         self,
         context: ContextTypes.DEFAULT_TYPE,
@@ -88,26 +169,27 @@ class MessageManager:
         """Отправка сообщения в выбранные телеграм-чаты с сохранением message_id и user_id."""
 
         message_text = await self.get_message(department, stage, **await self(row_id))
-        message_ids = []
-        actual_chat_ids = []
         logger.info(chat_ids)
         if isinstance(chat_ids, (int, str)):
             chat_ids = [chat_ids]
-        for chat_id in chat_ids:
-            try:
-                message = await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=f"✨{message_text}✨",
-                    reply_markup=reply_markup,
-                )
-                message_ids.append(message.message_id)
-                actual_chat_ids.append(chat_id)
-            except Exception as e:
+        results = await self._gather_limited(
+            context.bot.send_message(
+                chat_id=chat_id,
+                text=f"✨{message_text}✨",
+                reply_markup=reply_markup,
+            )
+            for chat_id in chat_ids
+        )
+
+        sent_messages = []
+        for chat_id, result in zip(chat_ids, results):
+            if isinstance(result, BaseException):
                 logger.info(
-                    f"🚨Ошибка при отправке сообщения в chat_id: {chat_id}. Ошибка: {e}"
+                    f"🚨Ошибка при отправке сообщения в chat_id: {chat_id}. Ошибка: {result}"
                 )
-                pass
-        self[row_id][f"{department}_messages"] = list(zip(actual_chat_ids, message_ids))
+                continue
+            sent_messages.append((chat_id, result.message_id))
+        await self.set_messages(row_id, department, sent_messages)
 
     async def resend_messages_with_tracking(
         self,
@@ -123,21 +205,96 @@ class MessageManager:
         if self[row_id].get(key) is None:
             raise RuntimeError(f"Ошибка! По ключу {department}_messages нет данных!")
 
-        actual_chat_ids = []
-        message_ids = []
         message_text = await self.get_message(department, stage, **await self(row_id))
-        for chat_id, message_id in self[row_id].get(key):
+        tracked_messages = self[row_id].get(key)
+        results = await self._gather_limited(
+            self._resend_message(
+                context, chat_id, message_id, f"🔄{message_text}", reply_markup
+            )
+            for chat_id, message_id in tracked_messages
+        )
+        await self._update_tracked_messages(row_id, department, tracked_messages, results)
+
+    async def edit_messages_with_tracking(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        row_id: int,
+        department: str,
+        stage: str,
+        reply_markup: InlineKeyboardMarkup = None,
+    ) -> None:
+        """
+        Редактирует отправленные ранее сообщения.
+        Если сообщение удалено или его уже нельзя редактировать, отправляет новое.
+        """
+
+        key = f"{department}_messages"
+        if self[row_id].get(key) is None:
+            raise RuntimeError(f"Ошибка! По ключу {department}_messages нет данных!")
+
+        message_text = f"🔄{await self.get_message(department, stage, **await self(row_id))}"
+
+        async def edit(chat_id: int | str, message_id: int) -> int:
             try:
-                message = await context.bot.send_message(
-                    chat_id=chat_id, text=f"🔄{message_text}", reply_markup=reply_markup
+                await context.bot.edit_message_text(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    text=message_text,
+                    reply_markup=reply_markup,
+                )
+            except BadRequest as e:
+                error = e.message.lower()
+                if "message is not modified" in error:
+                    return message_id
+                if "message to edit not found" not in error and "can't be edited" not in error:
+                    raise
+                logger.info(
+                    f"Сообщение {message_id} в chat_id: {chat_id} нельзя изменить, отправляем новое."
+                )
+                return await self._resend_message(
+                    context, chat_id, message_id, message_text, reply_markup
                 )
-                message_ids.append(message.message_id)
-                actual_chat_ids.append(chat_id)
-                await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-            except Exception as e:
-                logger.error(f"Не удалось обновить сообщение с chat_id: {chat_id}: {e}")
-                pass
-        self[row_id][key] = list(zip(actual_chat_ids, message_ids))
+            return message_id
+
+        tracked_messages = self[row_id].get(key)
+        results = await self._gather_limited(
+            edit(chat_id, message_id) for chat_id, message_id in tracked_messages
+        )
+        await self._update_tracked_messages(row_id, department, tracked_messages, results)
+
+    @staticmethod
+    async def _resend_message(
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int | str,
+        message_id: int,
+        text: str,
+        reply_markup: InlineKeyboardMarkup = None,
+    ) -> int:
+        """Отправляет новое сообщение и удаляет старое. Возвращает message_id нового сообщения."""
+        message = await context.bot.send_message(
+            chat_id=chat_id, text=text, reply_markup=reply_markup
+        )
+        try:
+            await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+        except Exception as e:
+            logger.error(f"Не удалось удалить сообщение с chat_id: {chat_id}: {e}")
+        return message.message_id
+
+    async def _update_tracked_messages(
+        self,
+        row_id: int,
+        department: str,
+        tracked_messages: list[tuple[int, int]],
+        results: list,
+    ) -> None:
+        """Сохраняет message_id обновлённых сообщений, пропуская чаты с ошибками."""
+        updated_messages = []
+        for (chat_id, _), result in zip(tracked_messages, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Не удалось обновить сообщение с chat_id: {chat_id}: {result}")
+                continue
+            updated_messages.append((chat_id, result))
+        await self.set_messages(row_id, department, updated_messages)
 
     async def send_department_messages(
         self,
@@ -160,9 +317,18 @@ class MessageManager:
         stage: str,
         reply_markup: InlineKeyboardMarkup = None,
     ):
-        await self.resend_messages_with_tracking(
-            context, row_id, department, stage, reply_markup=reply_markup
-        )
+        """
+        Обновляет сообщения отдела для новой стадии: на стадиях из RESEND_STAGES отправляет
+        новое сообщение (с уведомлением), на остальных редактирует отправленное ранее.
+        """
+        if stage in RESEND_STAGES.get(department, ()):
+            await self.resend_messages_with_tracking(
+                context, row_id, department, stage, reply_markup=reply_markup
+            )
+        else:
+            await self.edit_messages_with_tracking(
+                context, row_id, department, stage, reply_markup=reply_markup
+            )
 
     async def command_reply_message(self, update, context, row_id):
         try:
@@ -187,12 +353,7 @@ class MessageManager:
             messages = self[row_id].get(message_type, [])
             all_messages.extend(messages)
 
-        if "all_messages" not in self[row_id]:
-            self[row_id]["all_messages"] = []
-
-        self[row_id]["all_messages"] = all_messages
-
-        return self[row_id]["all_messages"]
+        return all_messages
 
 
 message_manager = MessageManager()
@@ -63,3 +63,12 @@ PAYMENT = {
     "paid": "Счет №{row_id} оплачен {approver}.\n{record_data_text}",
     "rejected": "Счет №{row_id} отклонен {approver}.\n{record_data_text}",
 }
+
+# Стадии, о которых отдел должен получить уведомление: старое сообщение удаляется
+# и отправляется новое. На остальных стадиях отправленное ранее сообщение редактируется.
+RESEND_STAGES = {
+    "initiator": {"paid", "rejected"},
+    "head": set(),
+    "finance": set(),
+    "payment": set(),
+}
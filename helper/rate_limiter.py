@@ -0,0 +1,148 @@
+import asyncio
+from datetime import timedelta
+
+from telegram import constants
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config.logging_config import logger
+
+# методы, отправляющие новые сообщения; изменение и удаление сообщений лимит на чат не расходует
+SEND_ENDPOINTS_PREFIX = "send"
+FORWARD_ENDPOINTS = ("forwardMessage", "forwardMessages", "copyMessage", "copyMessages")
+
+
+class TokenBucket:
+    """Пропускает в среднем rate запросов в секунду, допуская всплески до capacity запросов."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self._updated is not None:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        """Ожидает, пока не освободится место для запроса."""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                self._refill(loop.time())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """
+    Ограничитель исходящих запросов к Bot API.
+
+    Все запросы (кроме getUpdates) проходят через общий лимит overall_rate запросов в секунду.
+    Отправка сообщений в группы и каналы дополнительно проходит через лимит group_rate сообщений
+    в секунду на чат (всплесками до group_burst), как в AIORateLimiter из python-telegram-bot.
+    Личные чаты, изменение и удаление сообщений лимитом на чат не ограничиваются.
+    При ошибке RetryAfter все запросы приостанавливаются на указанное Telegram время,
+    после чего запрос повторяется (не более max_retries раз, либо rate_limit_args раз).
+    """
+
+    _MAX_CHAT_BUCKETS = 512
+
+    def __init__(
+        self,
+        overall_rate: float = constants.FloodLimit.MESSAGES_PER_SECOND,
+        group_rate: float = constants.FloodLimit.MESSAGES_PER_MINUTE_PER_GROUP / 60,
+        group_burst: float = constants.FloodLimit.MESSAGES_PER_MINUTE_PER_GROUP,
+        max_retries: int = 3,
+    ):
+        self.overall_rate = overall_rate
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._overall_bucket = TokenBucket(overall_rate, overall_rate)
+        self._chat_buckets: dict[int | str, TokenBucket] = {}
+        self._paused_until = 0.0
+        self._waiting = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих отправки."""
+        return self._waiting
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chat_buckets.clear()
+
+    def _get_chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        if len(self._chat_buckets) > self._MAX_CHAT_BUCKETS:
+            now = asyncio.get_running_loop().time()
+            for key, bucket in list(self._chat_buckets.items()):
+                if bucket.is_full(now):
+                    del self._chat_buckets[key]
+
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(self.group_rate, self.group_burst)
+        return self._chat_buckets[chat_id]
+
+    @staticmethod
+    def _is_group_message(endpoint: str, chat_id: int | str | None) -> bool:
+        """Отправка нового сообщения в группу или канал (отрицательный chat_id или @username)."""
+        if chat_id is None:
+            return False
+        if not (endpoint.startswith(SEND_ENDPOINTS_PREFIX) or endpoint in FORWARD_ENDPOINTS):
+            return False
+        try:
+            return int(chat_id) < 0
+        except ValueError:
+            return True
+
+    async def _wait_for_slot(self, endpoint: str, chat_id: int | str | None) -> None:
+        loop = asyncio.get_running_loop()
+        while (delay := self._paused_until - loop.time()) > 0:
+            await asyncio.sleep(delay)
+        if self._is_group_message(endpoint, chat_id):
+            await self._get_chat_bucket(chat_id).acquire()
+        await self._overall_bucket.acquire()
+
+    async def process_request(
+        self, callback, args, kwargs, endpoint, data, rate_limit_args
+    ):
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+
+        for attempt in range(max_retries + 1):
+            self._waiting += 1
+            try:
+                await self._wait_for_slot(endpoint, chat_id)
+            finally:
+                self._waiting -= 1
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt >= max_retries:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(
+                    f"Превышен лимит Telegram на {endpoint} (chat_id: {chat_id}), "
+                    f"повтор через {retry_after} с. В очереди запросов: {self._waiting}"
+                )
+                loop = asyncio.get_running_loop()
+                self._paused_until = max(
+                    self._paused_until, loop.time() + retry_after + 0.1
+                )
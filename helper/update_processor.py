@@ -0,0 +1,105 @@
+import asyncio
+import re
+import sys
+from collections.abc import AsyncIterator, Awaitable
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# callback_data кнопок одобрения и оплаты: approval_<действие>_<отдел>_<id>, payment_<id>
+ROW_ID_CALLBACK = re.compile(r"^(?:approval_[a-z]+_[a-z]+|payment)_(\d+)$")
+# команды со счётом в аргументе: /approve_record <id>, /reject_record <id>
+ROW_ID_COMMAND = re.compile(r"^/(?:approve_record|reject_record)(?:@\w+)?\s+(\d+)\s*$")
+
+
+def get_row_id(update: Update) -> int | None:
+    """id счёта, к которому относится обновление, или None."""
+
+    if update.callback_query and update.callback_query.data:
+        match = ROW_ID_CALLBACK.match(update.callback_query.data)
+    elif update.message and update.message.text:
+        match = ROW_ID_COMMAND.match(update.message.text)
+    else:
+        return None
+    return int(match.group(1)) if match else None
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений (не более max_concurrent_updates одновременно)
+    с последовательной обработкой обновлений одного пользователя и одного счёта.
+
+    Обновление сначала захватывает блокировки своих ключей - пользователя и, если обновление
+    относится к счёту, id счёта - и только затем место обработки, поэтому обновления, ожидающие
+    занятого пользователя или счёт, не занимают мест других обновлений. Блокировки захватываются
+    в порядке сортировки ключей, поэтому обновления с пересекающимися ключами не блокируют друг
+    друга взаимно. Блокировки удаляются, когда их никто не ожидает.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        # семафор базового класса захватывается до блокировок ключей, поэтому он создаётся
+        # без ограничения, а места обработки выдаёт собственный семафор после блокировок
+        self._concurrent_updates = sys.maxsize
+        super().__init__(sys.maxsize)
+        self._concurrent_updates = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._processing = 0
+        self._locks: dict[tuple[str, int], asyncio.Lock] = {}
+        self._lock_users: dict[tuple[str, int], int] = {}
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        return self._concurrent_updates
+
+    @property
+    def current_concurrent_updates(self) -> int:
+        return self._processing
+
+    @staticmethod
+    def get_keys(update: object) -> list[tuple[str, int]]:
+        """Ключи блокировок обновления в порядке захвата."""
+
+        if not isinstance(update, Update):
+            return []
+        keys = set()
+        if update.effective_user:
+            keys.add(("user", update.effective_user.id))
+        elif update.effective_chat:
+            keys.add(("chat", update.effective_chat.id))
+        row_id = get_row_id(update)
+        if row_id is not None:
+            keys.add(("row", row_id))
+        return sorted(keys)
+
+    @asynccontextmanager
+    async def _hold(self, key: tuple[str, int]) -> AsyncIterator[None]:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        async with AsyncExitStack() as stack:
+            for key in self.get_keys(update):
+                await stack.enter_async_context(self._hold(key))
+            async with self._slots:
+                self._processing += 1
+                try:
+                    await coroutine
+                finally:
+                    self._processing -= 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -39,11 +39,3 @@ async def get_departments(chat_id: str) -> list[str] | None:
     except Exception as e:
         logger.error(f"Ошибка поиска департамента по {chat_id}. Ошибка: {str(e)}")
         return None
-
-
-async def get_chat_id_by_nickname(nickname):
-    for role, nick_dict in Config.NICKNAMES.items():
-        for chat_number, nick in nick_dict.items():
-            if nick == nickname:
-                return chat_number
-    return None
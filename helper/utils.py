@@ -79,6 +79,23 @@ async def create_payment_keyboard(row_id: int) -> InlineKeyboardMarkup:
     return reply_markup
 
 
+async def create_not_paid_keyboard(
+    first_id: int, last_id: int, has_prev: bool, has_next: bool
+) -> InlineKeyboardMarkup | None:
+    """Создание кнопок "Назад" и "Далее" для постраничного просмотра неоплаченных счетов."""
+
+    buttons = []
+    if has_prev:
+        buttons.append(
+            InlineKeyboardButton("⬅️ Назад", callback_data=f"not_paid_prev_{first_id}")
+        )
+    if has_next:
+        buttons.append(
+            InlineKeyboardButton("Далее ➡️", callback_data=f"not_paid_next_{last_id}")
+        )
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
 async def split_long_message(text: str) -> list[str]:
     """Функция для разделения текста свыше 4096 символов"""
     max_length = 4096
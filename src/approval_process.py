@@ -1,29 +1,42 @@
+import asyncio
+from collections.abc import Awaitable
+
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from config.logging_config import logger
+from db import db
 from helper.message_manager import message_manager
-from helper.user_data import get_chat_ids, get_chat_id_by_nickname
+from helper.user_data import get_chat_ids
 from helper.utils import create_approval_keyboard, create_payment_keyboard
 from src.handlers import get_record_by_id
 
 
+async def notify_departments(**notifications: Awaitable) -> None:
+    """
+    Параллельно отправляет уведомления отделам: notify_departments(head=..., finance=...).
+    Ошибка уведомления одного отдела логируется и не мешает уведомлению остальных.
+    """
+    results = await asyncio.gather(*notifications.values(), return_exceptions=True)
+    for department, result in zip(notifications, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Не удалось отправить уведомление отделу {department}: {result}")
+
+
 async def initiator_to_head_start_message(
     context: ContextTypes.DEFAULT_TYPE, update: Update, row_id
 ) -> None:
     try:
         initiator_chat_id = update.effective_chat.id
-        if not context.bot_data.get("initiator_message"):
+        confirmed_message = context.user_data.pop("confirmed_message", None)
+        if not confirmed_message:
             department = "initiator"
             stage = "initiator_to_head"
             await message_manager.send_department_messages(
                 context, row_id, department, initiator_chat_id, stage
             )
         else:
-            await message_manager.update_data(
-                row_id,
-                {"initiator_messages": context.bot_data.get("initiator_message")},
-            )
-            del context.bot_data["initiator_message"]
+            await message_manager.set_messages(row_id, "initiator", confirmed_message)
     except Exception as e:
         raise RuntimeError(f"Ошибка при отправке стартового сообщения инициатору: {e}")
 
@@ -160,7 +173,7 @@ async def head_to_payment_message(
 
 
 async def finance_and_head_to_payment_message(
-    context: ContextTypes.DEFAULT_TYPE, row_id: int, approver: str | int
+    context: ContextTypes.DEFAULT_TYPE, row_id: int
 ) -> None:
     department = "finance"
     stage = "to_payment"
@@ -169,9 +182,9 @@ async def finance_and_head_to_payment_message(
             context, row_id, department, stage
         )
     else:
-        approver_id = await get_chat_id_by_nickname(approver)
+        finance_chat_ids = await db.get_decision_chat_ids(row_id, "finance")
         await message_manager.send_department_messages(
-            context, row_id, "finance", approver_id, "to_payment"
+            context, row_id, "finance", finance_chat_ids, "to_payment"
         )
 
 
@@ -239,10 +252,9 @@ async def finance_paid_message(
             context, row_id, "finance", "paid"
         )
     else:
-        finance_approver = record_dict["approved_by"].split(" и ")[1]
-        finance_chat_id = await get_chat_id_by_nickname(finance_approver)
+        finance_chat_ids = await db.get_decision_chat_ids(row_id, "finance")
         await message_manager.send_department_messages(
-            context, row_id, "finance", finance_chat_id, "paid"
+            context, row_id, "finance", finance_chat_ids, "paid"
         )
 
 
@@ -293,10 +305,9 @@ async def finance_reject_message(
             context, row_id, "finance", "rejected"
         )
     else:
-        finance_approver = record_dict["approved_by"].split(" и ")[1]
-        finance_chat_id = await get_chat_id_by_nickname(finance_approver)
+        finance_chat_ids = await db.get_decision_chat_ids(row_id, "finance")
         await message_manager.send_department_messages(
-            context, row_id, "finance", finance_chat_id, "rejected"
+            context, row_id, "finance", finance_chat_ids, "rejected"
         )
 
 
@@ -8,7 +8,7 @@ from config.logging_config import logger
 from helper.user_data import get_nickname
 from helper.utils import validate_period_dates
 from src.handlers import submit_record_command
-from src.sheets import GoogleSheetsManager
+from src.sheets import sheets_manager
 
 (
     INPUT_SUM,
@@ -40,7 +40,7 @@ async def enter_record(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
     # получаем chat_id отправителя команды /enter_record;
     # проверяем входит ли он в белый список;
-    # авторизуемся в Google Sheets, сохраняем данные о статьях, группах, партнёрах из таблицы "категории"
+    # сохраняем закэшированные данные о статьях, группах, партнёрах из таблицы "категории"
 
     context.user_data["initiator_chat_id"] = update.effective_chat.id
     if context.user_data["initiator_chat_id"] not in Config.initiator_chat_ids:
@@ -48,9 +48,7 @@ async def enter_record(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             "Команда запрещена! Вы не находитесь в списке инициаторов."
         )
 
-    manager = GoogleSheetsManager()
-    await manager.initialize_google_sheets()
-    options_dict, items = await manager.get_data()
+    options_dict, items = await sheets_manager.get_categories()
     context.user_data["options"], context.user_data["items"] = options_dict, items
 
     # отправляем сообщение "Введите сумму" от бота
@@ -372,10 +370,12 @@ async def confirm_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     initiator_id = query.from_user.id
     if query.data == "Подтвердить":
         context.args = context.user_data.get("final_command").split()
-        context.bot_data["initiator_message"] = [
-            (initiator_id, context.user_data["initiator_message"].message_id)
-        ]
+        initiator_message = context.user_data["initiator_message"]
         context.user_data.clear()
+        # сообщение с итоговой командой станет сообщением инициатора о новом счёте
+        context.user_data["confirmed_message"] = [
+            (initiator_id, initiator_message.message_id)
+        ]
         initiator_nickname = await get_nickname("initiator", initiator_id)
         logger.info(f"Счёт создан инициатором: {initiator_nickname}")
         await submit_record_command(update, context)
@@ -390,8 +390,7 @@ async def stop_dialog(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     """Обработчик команды /stop."""
 
     context.user_data.clear()
-    context.bot_data.clear()
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "Диалог был остановлен. Начните заново с командой /enter_record",
         reply_markup=InlineKeyboardMarkup([]),
     )
@@ -0,0 +1,360 @@
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import aiosqlite
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+
+from config.config import Config
+from config.logging_config import logger
+
+# Содержимое листов по умолчанию: заголовок таблицы счетов и пример таблицы "категории"
+DEFAULT_RECORDS = [
+    [
+        "",
+        "Дата",
+        "Сумма",
+        "Статья",
+        "Группа",
+        "Партнер",
+        "",
+        "",
+        "Комментарий",
+        "Месяц",
+        "Форма оплаты",
+        "id",
+    ],
+]
+DEFAULT_CATEGORIES = [
+    ["Статья", "Группа", "Партнер"],
+    ["Реклама", "Интернет", "Яндекс"],
+    ["Реклама", "Интернет", "VK"],
+    ["Реклама", "Наружная", "Билборды"],
+    ["Мероприятия", "Турниры", "Федерация тенниса"],
+]
+
+
+class QuotaErrorResponse:
+    """Ответ Google Sheets API 429 с теми атрибутами requests.Response, которые читает APIError."""
+
+    status_code = 429
+    body = {
+        "error": {
+            "code": 429,
+            "message": "Quota exceeded for quota metric 'Read requests' (fake)",
+            "status": "RESOURCE_EXHAUSTED",
+        }
+    }
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self.body)
+
+    def json(self) -> dict:
+        return self.body
+
+
+def quota_error() -> APIError:
+    """Ошибка превышения квоты в том виде, в котором её возвращает Google Sheets API."""
+
+    return APIError(QuotaErrorResponse())
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _grid_range(range_name: str, values: list[list[str]]) -> tuple[int, int, int, int]:
+    """Границы диапазона A1 (без названия листа) в индексах строк и столбцов; открытые границы - до конца данных."""
+
+    grid = a1_range_to_grid_range(range_name.rsplit("!", 1)[-1])
+    width = max(map(len, values), default=0)
+    return (
+        grid.get("startRowIndex", 0),
+        grid.get("endRowIndex", len(values)),
+        grid.get("startColumnIndex", 0),
+        grid.get("endColumnIndex", width),
+    )
+
+
+def _trim(rows: list[list[str]]) -> list[list[str]]:
+    """Отбрасывает пустые ячейки в конце строк и пустые строки в конце, как это делает API."""
+
+    rows = [list(row) for row in rows]
+    for row in rows:
+        while row and row[-1] == "":
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+class FakeSheetsBackend:
+    """
+    Хранилище листов для работы GoogleSheetsManager без Google Sheets: в памяти
+    или, если указан path, в файле SQLite.
+
+    Каждый запрос выполняется с задержкой latency секунд и с вероятностью quota_error_rate
+    завершается ошибкой превышения квоты (APIError 429). Количество запросов по видам
+    хранится в calls.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        latency: float = 0.0,
+        quota_error_rate: float = 0.0,
+        sheets: dict[int | str, list[list[str]]] | None = None,
+    ):
+        self.path = path
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.sheets = {str(sheet_id): values for sheet_id, values in (sheets or {}).items()}
+        self.modified_time = _now()
+        self.calls: dict[str, int] = {}
+        self._conn: aiosqlite.Connection | None = None
+        self._load_lock = asyncio.Lock()
+
+    async def request(self, operation: str) -> None:
+        """Имитирует один запрос к API: учёт, задержка и, возможно, ошибка квоты."""
+
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.quota_error_rate and random.random() < self.quota_error_rate:
+            raise quota_error()
+        if self.path is not None and self._conn is None:
+            await self._load()
+
+    def blocking_request(self, operation: str) -> None:
+        """То же для синхронных методов gspread, которые вызываются в отдельном потоке."""
+
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.quota_error_rate and random.random() < self.quota_error_rate:
+            raise quota_error()
+
+    def values(self, sheet_id: int | str) -> list[list[str]]:
+        return self.sheets.setdefault(str(sheet_id), [])
+
+    async def changed(self, sheet_id: int | str) -> None:
+        """Отмечает изменение листа и сохраняет его в SQLite."""
+
+        self.modified_time = _now()
+        if self._conn is not None:
+            await self._conn.execute(
+                "INSERT OR REPLACE INTO fake_sheets (sheet_id, sheet_values, modified_time) VALUES (?, ?, ?)",
+                (
+                    str(sheet_id),
+                    json.dumps(self.values(sheet_id), ensure_ascii=False),
+                    self.modified_time,
+                ),
+            )
+            await self._conn.commit()
+
+    async def _load(self) -> None:
+        async with self._load_lock:
+            if self._conn is not None:
+                return
+            conn = await aiosqlite.connect(self.path)
+            await conn.execute(
+                """CREATE TABLE IF NOT EXISTS fake_sheets
+                                  (sheet_id TEXT PRIMARY KEY,
+                                   sheet_values TEXT NOT NULL,
+                                   modified_time TEXT NOT NULL)"""
+            )
+            async with conn.execute(
+                "SELECT sheet_id, sheet_values, modified_time FROM fake_sheets"
+            ) as cursor:
+                rows = await cursor.fetchall()
+            for sheet_id, sheet_values, modified_time in rows:
+                self.sheets[sheet_id] = json.loads(sheet_values)
+                self.modified_time = max(self.modified_time, modified_time)
+            self._conn = conn
+            logger.info(f"Загружены листы локальной замены Google Sheets из {self.path}.")
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+class FakeWorksheet:
+    """Лист локальной замены Google Sheets с методами gspread_asyncio.AsyncioGspreadWorksheet."""
+
+    def __init__(self, backend: FakeSheetsBackend, sheet_id: int | str):
+        self.backend = backend
+        self.id = sheet_id
+        self.title = str(sheet_id)
+
+    @property
+    def _values(self) -> list[list[str]]:
+        return self.backend.values(self.id)
+
+    def _read(self, range_name: str) -> list[list[str]]:
+        row_start, row_end, col_start, col_end = _grid_range(range_name, self._values)
+        return _trim(row[col_start:col_end] for row in self._values[row_start:row_end])
+
+    def _write(self, row_start: int, col_start: int, rows: list[list]) -> None:
+        values = self._values
+        while len(values) < row_start + len(rows):
+            values.append([])
+        for index, row in enumerate(rows):
+            target = values[row_start + index]
+            if len(target) < col_start + len(row):
+                target.extend([""] * (col_start + len(row) - len(target)))
+            target[col_start : col_start + len(row)] = [
+                "" if cell is None else str(cell) for cell in row
+            ]
+
+    async def get_all_values(self) -> list[list[str]]:
+        await self.backend.request("get_all_values")
+        rows = _trim(self._values)
+        width = max(map(len, rows), default=0)
+        return [row + [""] * (width - len(row)) for row in rows]
+
+    async def get_all_records(self, head: int = 1) -> list[dict[str, str]]:
+        await self.backend.request("get_all_records")
+        rows = _trim(self._values)
+        if len(rows) < head:
+            return []
+        header = rows[head - 1]
+        return [
+            dict(zip(header, row + [""] * (len(header) - len(row)))) for row in rows[head:]
+        ]
+
+    async def row_values(self, row: int) -> list[str]:
+        await self.backend.request("row_values")
+        rows = _trim(self._values[row - 1 : row])
+        return rows[0] if rows else []
+
+    async def get(self, range_name: str, **kwargs) -> list[list[str]]:
+        await self.backend.request("get")
+        return self._read(range_name)
+
+    async def batch_get(
+        self, ranges: list[str], major_dimension: str | None = None, **kwargs
+    ) -> list[list[list[str]]]:
+        await self.backend.request("batch_get")
+        result = []
+        for range_name in ranges:
+            rows = self._read(range_name)
+            if major_dimension == "COLUMNS":
+                width = max(map(len, rows), default=0)
+                rows = _trim(
+                    [[row[col] if col < len(row) else "" for row in rows] for col in range(width)]
+                )
+            result.append(rows)
+        return result
+
+    async def update(self, range_name, values=None, **kwargs) -> dict:
+        await self.backend.request("update")
+        if isinstance(range_name, list):
+            range_name, values = values, range_name
+        row_start, _, col_start, _ = _grid_range(range_name, self._values)
+        self._write(row_start, col_start, values)
+        await self.backend.changed(self.id)
+        return {"updatedRange": f"'{self.title}'!{range_name}", "updatedRows": len(values)}
+
+    async def append_rows(
+        self,
+        values: list[list],
+        value_input_option: str = "RAW",
+        insert_data_option: str | None = None,
+        table_range: str | None = None,
+    ) -> dict:
+        await self.backend.request("append_rows")
+        width = max(map(len, values), default=0)
+        _, _, col_start, col_end = _grid_range(table_range or "A1", self._values)
+        col_end = max(col_end, col_start + width)
+        last_row = max(
+            (
+                index
+                for index, row in enumerate(self._values)
+                if any(cell != "" for cell in row[col_start:col_end])
+            ),
+            default=-1,
+        )
+        row_start = last_row + 1
+        self._write(row_start, col_start, values)
+        await self.backend.changed(self.id)
+        updated_range = (
+            f"{rowcol_to_a1(row_start + 1, col_start + 1)}:"
+            f"{rowcol_to_a1(row_start + len(values), col_start + width)}"
+        )
+        return {
+            "tableRange": f"'{self.title}'!{table_range}",
+            "updates": {
+                "updatedRange": f"'{self.title}'!{updated_range}",
+                "updatedRows": len(values),
+            },
+        }
+
+    async def format(self, ranges: str | list[str], format: dict) -> dict:
+        await self.backend.request("format")
+        return {}
+
+    async def batch_format(self, formats: list[dict]) -> dict:
+        await self.backend.request("batch_format")
+        return {}
+
+
+class FakeSpreadsheet:
+    """Таблица локальной замены Google Sheets с методами gspread_asyncio.AsyncioGspreadSpreadsheet."""
+
+    def __init__(self, backend: FakeSheetsBackend, key: str):
+        self.backend = backend
+        self.id = key
+
+    @property
+    def ss(self) -> "FakeSpreadsheet":
+        # в gspread_asyncio синхронная таблица gspread доступна как .ss
+        return self
+
+    def get_lastUpdateTime(self) -> str:
+        self.backend.blocking_request("get_lastUpdateTime")
+        return self.backend.modified_time
+
+    async def get_worksheet_by_id(self, sheet_id: int | str) -> FakeWorksheet:
+        await self.backend.request("get_worksheet_by_id")
+        return FakeWorksheet(self.backend, sheet_id)
+
+
+class FakeClient:
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+
+    async def open_by_key(self, key: str) -> FakeSpreadsheet:
+        await self.backend.request("open_by_key")
+        return FakeSpreadsheet(self.backend, key)
+
+
+class FakeClientManager:
+    """Замена gspread_asyncio.AsyncioGspreadClientManager, работающая с FakeSheetsBackend."""
+
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+        self._client = FakeClient(backend)
+
+    async def authorize(self) -> FakeClient:
+        return self._client
+
+
+def create_fake_client_manager() -> FakeClientManager:
+    """Локальная замена Google Sheets с настройками из Config."""
+
+    backend = FakeSheetsBackend(
+        path=Config.google_sheets_fake_path,
+        latency=Config.google_sheets_fake_latency,
+        quota_error_rate=Config.google_sheets_fake_quota_error_rate,
+        sheets={
+            Config.google_sheets_records_sheet_id: [list(row) for row in DEFAULT_RECORDS],
+            Config.google_sheets_categories_sheet_id: [list(row) for row in DEFAULT_CATEGORIES],
+        },
+    )
+    logger.warning("Google Sheets заменён локальной заглушкой (GOOGLE_SHEETS_BACKEND=fake).")
+    return FakeClientManager(backend)
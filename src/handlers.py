@@ -1,23 +1,23 @@
-import textwrap
-
-from telegram import Update
+from telegram import InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
 from config.config import Config
 from config.logging_config import logger
 from db import db
+from helper.callback_dedup import callback_deduplicator
 from helper.message_manager import message_manager
 from helper.user_data import (
     get_nickname,
     get_chat_ids,
     get_department,
-    get_chat_id_by_nickname,
 )
 from helper.utils import (
     validate_period_dates,
     split_long_message,
     get_record_info,
     get_record_by_id,
+    create_not_paid_keyboard,
 )
 from src.approval_process import (
     payment_from_head_approval_message,
@@ -40,8 +40,12 @@ from src.approval_process import (
     head_reject_message,
     finance_reject_message,
     payment_reject_message,
+    notify_departments,
 )
-from src.sheets import add_record_to_google_sheet
+from src.sheet_outbox import sheet_outbox
+from src.sheets import sheets_manager
+
+NOT_PAID_PAGE_SIZE = 5
 
 
 async def check_access(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -180,24 +184,35 @@ async def add_data_to_message_manager(
 async def approval_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обработчик нажатий пользователем кнопок "Одобрить" или "Отклонить."
+    Повторное нажатие той же кнопки не обрабатывается.
     """
     try:
         query = update.callback_query
         _, action, department, row_id = query.data.split("_")
         row_id = int(row_id)
-        approver_id = query.from_user.id
-        approver = await get_nickname(department, approver_id)
-        amount = message_manager[row_id].get("amount")
     except Exception as e:
         raise RuntimeError(f'Ошибка обработки кнопок "Одобрить" и "Отклонить". {e}')
 
-    try:
-        # распределяем данные платежа по отделам для принятия решения об одобрении
-        await approval_process(
-            context, action, row_id, approver, department, amount, approver_id
-        )
-    except Exception as e:
-        raise RuntimeError(f"Не удалось распределить данные по отделам: {e}")
+    action_key = (row_id, action, department)
+    if not callback_deduplicator.claim(query.id, action_key):
+        await query.answer("уже обработано")
+        return
+
+    with callback_deduplicator.release_on_error(query.id, action_key):
+        try:
+            approver_id = query.from_user.id
+            approver = await get_nickname(department, approver_id)
+            amount = (await message_manager.load(row_id)).get("amount")
+        except Exception as e:
+            raise RuntimeError(f'Ошибка обработки кнопок "Одобрить" и "Отклонить". {e}')
+
+        try:
+            # распределяем данные платежа по отделам для принятия решения об одобрении
+            await approval_process(
+                context, action, row_id, approver, department, amount, approver_id
+            )
+        except Exception as e:
+            raise RuntimeError(f"Не удалось распределить данные по отделам: {e}")
 
 
 async def approval_process(
@@ -213,10 +228,12 @@ async def approval_process(
     if action == "approve":
 
         if department == "head" and amount >= 50000:
-            await approve_to_finance_department(context, row_id, approver)
+            await approve_to_finance_department(context, row_id, approver, approver_id)
 
         elif department == "head" and amount < 50000:
-            await approve_head_to_payment_department(context, row_id, approver)
+            await approve_head_to_payment_department(
+                context, row_id, approver, approver_id
+            )
 
         else:
             await approve_finance_to_payment_department(
@@ -224,13 +241,14 @@ async def approval_process(
             )
 
     else:
-        await reject_record(context, row_id, approver)
+        await reject_record(context, row_id, approver, department, approver_id)
 
 
 async def approve_to_finance_department(
     context: ContextTypes.DEFAULT_TYPE,
     row_id: int,
     approver: str,
+    approver_id: int,
 ) -> None:
     """
     Изменение количества апрувов и статуса платежа.
@@ -240,57 +258,88 @@ async def approve_to_finance_department(
 
     # меняем статус и добавляем апрув в базу данных
     record_dict = await update_storage_data(
-        row_id, approved_by=approver, status="Pending", approvals_received=1
+        row_id,
+        expected_status="Not processed",
+        status="Pending",
+        approved_by=approver,
+        approvals_received=1,
+        department="head",
+        chat_id=approver_id,
+        decision="approve",
     )
 
-    # меняем или отправляем новое сообщение инициатору
-    await initiator_head_to_finance_message(context, row_id, record_dict)
-
-    # меняем сообщение руководителю департамента
-    await head_to_finance_message(context, row_id)
-
-    # отправляем сообщение сотрудникам финансового отдела
-    await finance_from_head_approval_message(context, row_id)
+    await notify_departments(
+        # меняем или отправляем новое сообщение инициатору
+        initiator=initiator_head_to_finance_message(context, row_id, record_dict),
+        # меняем сообщение руководителю департамента
+        head=head_to_finance_message(context, row_id),
+        # отправляем сообщение сотрудникам финансового отдела
+        finance=finance_from_head_approval_message(context, row_id),
+    )
 
 
-async def update_storage_data(row_id, **kwargs: int | str | None):
+async def update_storage_data(
+    row_id: int,
+    expected_status: str | tuple[str, ...],
+    status: str,
+    approved_by: str | None = None,
+    approvals_received: int | None = None,
+    department: str | None = None,
+    chat_id: int | None = None,
+    decision: str | None = None,
+    export_to_sheet: bool = False,
+) -> dict:
+    """
+    Переводит счёт в новый статус одним запросом к базе данных
+    и сохраняет решение сотрудника chat_id из отдела department.
+    При export_to_sheet=True счёт в той же транзакции ставится в очередь выгрузки в Google Sheets.
+    Если счёт уже не находится в статусе expected_status, переход не выполняется.
+    """
     try:
-        async with db:
-            is_approver_exist = await db.get_column_by_id("approved_by", row_id)
-            if is_approver_exist and kwargs.get("approved_by"):
-                kwargs["approved_by"] = f"{is_approver_exist} и {kwargs['approved_by']}"
-            update_data = {
-                key: value for key, value in kwargs.items() if value is not None
-            }
-            await db.update_row_by_id(row_id, update_data)
-            record_dict = await db.get_row_by_id(row_id)
-
+        record_dict = await db.transition(
+            row_id,
+            expected_status,
+            status,
+            approved_by,
+            approvals_received,
+            department=department,
+            chat_id=chat_id,
+            decision=decision,
+            export_to_sheet=export_to_sheet,
+        )
     except Exception as e:
         raise RuntimeError(f"Не удалось обновить данные в базе данных: {e}")
 
-    if kwargs.get("approved_by"):
+    if record_dict is None:
+        raise RuntimeError(f"Счёт №{row_id} уже обработан.")
+
+    if approved_by:
         await message_manager.update_data(
-            row_id, {"approver": kwargs.get("approved_by")}
+            row_id, {"approver": record_dict.get("approved_by")}
         )
 
     return record_dict
 
 
 async def approve_head_to_payment_department(
-    context: ContextTypes.DEFAULT_TYPE, row_id: int, approver: str
+    context: ContextTypes.DEFAULT_TYPE, row_id: int, approver: str, approver_id: int
 ) -> None:
     record_dict = await update_storage_data(
         row_id,
-        approved_by=approver,
+        expected_status="Not processed",
         status="Approved",
+        approved_by=approver,
         approvals_received=1,
+        department="head",
+        chat_id=approver_id,
+        decision="approve",
     )
 
-    await initiator_head_to_payment_message(context, row_id, record_dict)
-
-    await head_to_payment_message(context, row_id)
-
-    await payment_from_head_approval_message(context, row_id)
+    await notify_departments(
+        initiator=initiator_head_to_payment_message(context, row_id, record_dict),
+        head=head_to_payment_message(context, row_id),
+        payment=payment_from_head_approval_message(context, row_id),
+    )
 
 
 async def approve_finance_to_payment_department(
@@ -298,75 +347,108 @@ async def approve_finance_to_payment_department(
 ) -> None:
     await update_storage_data(
         row_id,
-        approved_by=approver,
+        expected_status="Pending",
         status="Approved",
+        approved_by=approver,
         approvals_received=2,
+        department="finance",
+        chat_id=approver_id,
+        decision="approve",
     )
 
-    await initiator_head_and_finance_to_payment_message(context, row_id)
-
-    await head_and_finance_to_payment_message(context, row_id)
-
-    await finance_and_head_to_payment_message(context, row_id, approver)
-
-    await payment_from_head_and_finance_approval_message(context, row_id)
+    await notify_departments(
+        initiator=initiator_head_and_finance_to_payment_message(context, row_id),
+        head=head_and_finance_to_payment_message(context, row_id),
+        finance=finance_and_head_to_payment_message(context, row_id),
+        payment=payment_from_head_and_finance_approval_message(context, row_id),
+    )
 
 
 async def payment_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    Обработчик нажатий пользователем кнопки "Оплачено"
+    Обработчик нажатий пользователем кнопки "Оплачено".
+    Повторное нажатие кнопки не обрабатывается.
     """
 
     try:
         query = update.callback_query
         response_list = query.data.split("_")
         row_id = int(response_list[1])
-        payment_chat_id = query.from_user.id
-        approver = await get_nickname("payment", query.from_user.id)
-        await message_manager.update_data(row_id, {"approver": approver})
     except Exception as e:
         raise RuntimeError(f'Ошибка считывания данных с кнопки "Оплачено". Ошибка: {e}')
 
-    await make_payment(context, row_id, payment_chat_id)
+    action_key = (row_id, "paid", "payment")
+    if not callback_deduplicator.claim(query.id, action_key):
+        await query.answer("уже обработано")
+        return
+
+    with callback_deduplicator.release_on_error(query.id, action_key):
+        try:
+            payment_chat_id = query.from_user.id
+            approver = await get_nickname("payment", query.from_user.id)
+            await message_manager.load(row_id)
+            await message_manager.update_data(row_id, {"approver": approver})
+        except Exception as e:
+            raise RuntimeError(f'Ошибка считывания данных с кнопки "Оплачено". Ошибка: {e}')
+
+        await make_payment(context, row_id, payment_chat_id)
 
 
 async def reject_record(
-    context: ContextTypes.DEFAULT_TYPE, row_id: int, approver: str
+    context: ContextTypes.DEFAULT_TYPE,
+    row_id: int,
+    approver: str,
+    department: str,
+    approver_id: int,
 ) -> None:
     """Отправка сообщения об отклонении платежа и изменении статуса платежа."""
 
     await message_manager.update_data(row_id, {"approver": approver})
-    record_dict = await update_storage_data(row_id, status="Rejected")
-
-    await initiator_reject_message(context, row_id, record_dict)
+    record_dict = await update_storage_data(
+        row_id,
+        expected_status=("Not processed", "Pending", "Approved"),
+        status="Rejected",
+        department=department,
+        chat_id=approver_id,
+        decision="reject",
+    )
 
-    await head_reject_message(context, row_id)
-    logger.info(record_dict.get("approvals_received"))
+    notifications = {
+        "initiator": initiator_reject_message(context, row_id, record_dict),
+        "head": head_reject_message(context, row_id),
+    }
     if record_dict.get("approvals_received") == 1:
-        await finance_reject_message(context, row_id, record_dict)
-    logger.info(record_dict.get("approvals_received"))
+        notifications["finance"] = finance_reject_message(context, row_id, record_dict)
+    await notify_departments(**notifications)
 
-    del message_manager[row_id]
+    await message_manager.remove(row_id)
 
 
 async def make_payment(
     context: ContextTypes.DEFAULT_TYPE, row_id: int, payment_chat_id: int
 ) -> None:
-    """Добавление записи в Google Sheets после успешного платежа."""
-    record_dict = await update_storage_data(row_id, status="Paid")
-
-    await initiator_paid_message(context, row_id, record_dict)
-
-    await head_paid_message(context, row_id)
-
-    if record_dict.get("approval_received") == 2:
-        await finance_paid_message(context, row_id, record_dict)
-
-    await payment_paid_message(context, row_id, payment_chat_id)
+    """Оплата счёта: счёт ставится в очередь выгрузки в Google Sheets вместе со сменой статуса."""
+    record_dict = await update_storage_data(
+        row_id,
+        expected_status="Approved",
+        status="Paid",
+        department="payment",
+        chat_id=payment_chat_id,
+        decision="paid",
+        export_to_sheet=True,
+    )
+    sheet_outbox.notify()
 
-    del message_manager[row_id]
+    notifications = {
+        "initiator": initiator_paid_message(context, row_id, record_dict),
+        "head": head_paid_message(context, row_id),
+        "payment": payment_paid_message(context, row_id, payment_chat_id),
+    }
+    if record_dict.get("approvals_received") == 2:
+        notifications["finance"] = finance_paid_message(context, row_id, record_dict)
+    await notify_departments(**notifications)
 
-    await add_record_to_google_sheet(record_dict)
+    await message_manager.remove(row_id)
 
 
 async def reject_record_command(
@@ -391,7 +473,7 @@ async def reject_record_command(
         await update.message.reply_text("Вы не можете менять статус счёта!")
         return
 
-    row_id = row_id[0]
+    row_id = int(row_id[0])
 
     approver = await get_nickname(department, approver_id)
     async with db:
@@ -430,11 +512,9 @@ async def reject_record_command(
             )
             return
 
-    await message_manager.update_data(
-        row_id, {"record_data_text": await get_record_info(record_dict)}
-    )
+    await message_manager.load(row_id)
     await update.message.reply_text(f"Счёт №{row_id} отклонён!")
-    await reject_record(context, row_id, approver)
+    await reject_record(context, row_id, approver, department, int(approver_id))
 
 
 async def approve_record_command(
@@ -487,13 +567,10 @@ async def approve_record_command(
 
     action = "approve"
     amount = record_dict.get("amount")
-    initiator_chat_id = record_dict.get("initiator_id")
     approver = await get_nickname(department, approver_id)
+    await message_manager.load(row_id)
     await message_manager.update_data(row_id, {"approver": approver})
 
-    if not message_manager[row_id].get("record_data_text"):
-        await add_data_to_message_manager(record_dict, row_id, initiator_chat_id)
-
     if department in ("head", "finance"):
         await approval_process(
             context, action, row_id, approver, department, amount, approver_id
@@ -532,35 +609,88 @@ async def check_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text(status_message)
 
 
+async def reload_categories_command(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Обработчик команды /reload_categories: перечитывает таблицу "категории" без ожидания фонового обновления."""
+
+    if update.effective_user.id not in Config.white_list:
+        raise PermissionError("Команда запрещена! Вас нет в белом списке.")
+
+    await sheets_manager.reload_categories(force=True)
+    _, items = await sheets_manager.get_categories()
+    await update.message.reply_text(f"Категории обновлены. Статей расхода: {len(items)}.")
+
+
 async def show_not_paid_command(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     """
-    Возвращает инициатору в тг-чат неоплаченные заявки на платежи из таблицы "approvals" в удобном формате
+    Возвращает инициатору в тг-чат первую страницу неоплаченных заявок на платежи
+    из таблицы "approvals" в удобном формате
     """
 
-    async with db:
-        rows = await db.find_not_paid()
-    messages = []
-
-    for i, record in enumerate(rows, start=1):
-        line = ", ".join([f"{key}: {value}" for key, value in record.items()])
-        message_line = f"{i}. {line}"
-        wrapped_message = textwrap.fill(message_line, width=4096)
-        messages.append(wrapped_message)
-
-    final_text = "\n\n".join(messages)
-    if not final_text:
-        await update.message.reply_text("Заявок не обнаружено")
-
-    if len(final_text) >= 4096:  # Максимальная длина сообщения в Telegram
-        parts = await split_long_message(final_text)
-        for part in parts:
-            await update.message.reply_text(part)
-    if final_text:
-        await update.message.reply_text(final_text)
-
-    return
+    text, reply_markup = await get_not_paid_page()
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+
+async def not_paid_page_handler(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Обработчик нажатий кнопок "Назад" и "Далее" в списке неоплаченных заявок."""
+
+    query = update.callback_query
+    *_, direction, cursor_id = query.data.split("_")
+    text, reply_markup = await get_not_paid_page(int(cursor_id), direction == "next")
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # повторное нажатие или список не изменился: Telegram не меняет сообщение на такое же
+        if "message is not modified" not in e.message.lower():
+            raise
+        await query.answer("Список не изменился")
+        return
+    await query.answer()
+
+
+async def get_not_paid_page(
+    cursor_id: int = 0, forward: bool = True
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """
+    Формирует страницу неоплаченных заявок после (или перед) заявкой cursor_id.
+    Из базы данных читается только одна страница и одна лишняя строка для определения,
+    есть ли следующая страница.
+    """
+
+    total = await db.count_not_paid()
+    if not total:
+        return "Заявок не обнаружено", None
+
+    rows = await db.find_not_paid(cursor_id, forward, NOT_PAID_PAGE_SIZE + 1)
+    if not rows:
+        # заявки страницы уже обработаны - показываем первую страницу
+        cursor_id, forward = 0, True
+        rows = await db.find_not_paid(limit=NOT_PAID_PAGE_SIZE + 1)
+
+    has_more = len(rows) > NOT_PAID_PAGE_SIZE
+    if forward:
+        rows = rows[:NOT_PAID_PAGE_SIZE]
+        has_prev, has_next = cursor_id > 0, has_more
+    else:
+        rows = rows[-NOT_PAID_PAGE_SIZE:]
+        has_prev, has_next = has_more, True
+
+    messages = [f"Неоплаченные счета (всего: {total}):"]
+    for record in rows:
+        messages.append(", ".join([f"{key}: {value}" for key, value in record.items()]))
+    text = "\n\n".join(messages)
+    if len(text) > 4096:  # Максимальная длина сообщения в Telegram
+        text = (await split_long_message(text))[0]
+
+    reply_markup = await create_not_paid_keyboard(
+        rows[0]["id заявки"], rows[-1]["id заявки"], has_prev, has_next
+    )
+    return text, reply_markup
 
 
 import traceback
@@ -6,8 +6,13 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
+from telegram.request import BaseRequest
 
 from config.config import Config
+from config.logging_config import logger
+from db import db
+from helper.rate_limiter import TelegramRateLimiter
+from helper.update_processor import KeyedUpdateProcessor
 from src.conversation_handler import (
     enter_record,
     input_sum,
@@ -26,11 +31,15 @@ from src.handlers import (
     approval_handler,
     payment_handler,
     show_not_paid_command,
+    reload_categories_command,
+    not_paid_page_handler,
     approve_record_command,
     reject_record_command,
     check_status,
     error_callback,
 )
+from src.sheet_outbox import sheet_outbox, sheet_reconciler
+from src.sheets import sheets_manager
 
 (
     INPUT_SUM,
@@ -44,9 +53,57 @@ from src.handlers import (
 ) = range(8)
 
 
-def main() -> None:
-    """Основная функция для запуска бота."""
-    application = Application.builder().token(Config.telegram_bot_token).build()
+async def post_init(application: Application) -> None:
+    """Открывает общие соединения с базой данных и Google Sheets при старте бота."""
+    await db.connect()
+    await db.migrate()
+    try:
+        worksheet = await sheets_manager.get_worksheet(sheets_manager.records_sheet_id)
+        if Config.google_sheets_format_once:
+            await sheets_manager.apply_formatting(worksheet)
+        await sheets_manager.reload_categories(force=True)
+    except Exception as e:
+        logger.error(f"Не удалось подключиться к Google Sheets при старте: {e}")
+    sheets_manager.start_categories_refresh(
+        Config.google_sheets_categories_refresh_interval
+    )
+    sheet_outbox.start()
+    sheet_reconciler.start()
+
+
+async def post_shutdown(application: Application) -> None:
+    """
+    Останавливает фоновые задачи и закрывает соединения с базой данных
+    и с файлом локальной замены Google Sheets при остановке бота.
+    """
+    await sheets_manager.stop_categories_refresh()
+    await sheet_reconciler.stop()
+    await sheet_outbox.stop()
+    if Config.google_sheets_backend == "fake":
+        await sheets_manager.agcm.backend.close()
+    await db.close()
+
+
+def create_application(
+    request: BaseRequest | None = None, rate_limit: bool = True
+) -> Application:
+    """
+    Создаёт приложение бота со всеми обработчиками.
+    request и rate_limit позволяют подменить отправку запросов к Bot API (например, в замерах).
+    """
+    builder = (
+        Application.builder()
+        .token(Config.telegram_bot_token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(KeyedUpdateProcessor(Config.telegram_concurrent_updates))
+    )
+    if rate_limit:
+        builder = builder.rate_limiter(TelegramRateLimiter())
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+
     # application.add_handler(MessageHandler(~filters.User(user_id=Config.white_list), check_access))
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("submit_record", submit_record_command))
@@ -54,8 +111,10 @@ def main() -> None:
     application.add_handler(CommandHandler("approve_record", approve_record_command))
     application.add_handler(CommandHandler("show_not_paid", show_not_paid_command))
     application.add_handler(CommandHandler("check", check_status))
+    application.add_handler(CommandHandler("reload_categories", reload_categories_command))
     application.add_handler(CallbackQueryHandler(approval_handler, pattern="^approval_.*"))
     application.add_handler(CallbackQueryHandler(payment_handler, pattern="^payment_.*"))
+    application.add_handler(CallbackQueryHandler(not_paid_page_handler, pattern="^not_paid_.*"))
     conversation_handler = ConversationHandler(
         entry_points=[CommandHandler("enter_record", enter_record)],
         states={
@@ -74,7 +133,18 @@ def main() -> None:
     )
     application.add_handler(conversation_handler)
     application.add_error_handler(error_callback)
-    application.run_polling(close_loop=False)
+    return application
+
+
+def main() -> None:
+    """Основная функция для запуска бота."""
+    application = create_application()
+    if Config.telegram_update_mode == "webhook":
+        from src.webhook import run_webhook
+
+        run_webhook(application)
+    else:
+        application.run_polling(close_loop=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,292 @@
+import asyncio
+
+from config.config import Config
+from config.logging_config import logger
+from db import db
+from src.sheets import sheets_manager
+
+
+class SheetOutbox:
+    """
+    Фоновая выгрузка оплаченных счетов в Google Sheets.
+
+    Счета попадают в таблицу 'sheet_outbox' в одной транзакции со сменой статуса на Paid,
+    поэтому не теряются при недоступности Google Sheets или перезапуске бота. Фоновая задача
+    забирает до batch_size счетов и записывает их в таблицу одним запросом. Если пачка не
+    записалась, счета выгружаются по одному, чтобы один ошибочный счёт не задерживал остальные.
+    Счета удаляются из очереди сразу после добавления строк в таблицу, и ошибка следующих шагов
+    не приводит к повторной записи: строки счёта попадают в таблицу один раз.
+    Выгрузка невыгруженного счёта откладывается с экспоненциально растущей задержкой, но не более
+    max_retry_delay секунд, а после max_attempts неудачных попыток прекращается.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = Config.sheet_outbox_batch_size,
+        poll_interval: float = Config.sheet_outbox_poll_interval,
+        max_retry_delay: float = Config.sheet_outbox_max_retry_delay,
+        max_attempts: int = Config.sheet_outbox_max_attempts,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+        # счета, добавленные в таблицу, но ещё не удалённые из очереди
+        self._exported: set[int] = set()
+
+    def notify(self) -> None:
+        """Сообщает фоновой задаче о новых счетах в очереди."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Запускает фоновую выгрузку."""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую выгрузку, дождавшись завершения текущей записи в таблицу."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    async def run(self) -> None:
+        while not self._stopping:
+            try:
+                exported = await self.export_batch()
+            except Exception as e:
+                logger.error(f"Ошибка выгрузки счетов в таблицу: {e}")
+                exported = 0
+
+            if exported < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def export_batch(self) -> int:
+        """Выгружает в таблицу одну пачку счетов из очереди. Возвращает количество выгруженных счетов."""
+        await self.forget_exported()
+        records = await db.get_sheet_outbox(self.batch_size)
+        if not records:
+            return 0
+
+        row_ids = [record["id"] for record in records]
+        try:
+            await self.write(records)
+        except Exception as e:
+            if len(records) == 1:
+                await self.handle_failure(records[0], e)
+                return 0
+            logger.warning(
+                f"Не удалось выгрузить счета {row_ids} в таблицу одной записью, "
+                f"выгружаем по одному: {e}"
+            )
+            return await self.export_one_by_one(records)
+
+        logger.info(
+            f"Счета {row_ids} выгружены в таблицу. {self.describe(await self.stats())}."
+        )
+        return len(records)
+
+    async def export_one_by_one(self, records: list[dict[str, any]]) -> int:
+        """Выгружает счета в таблицу по одному. Возвращает количество выгруженных счетов."""
+        exported = 0
+        for record in records:
+            try:
+                await self.write([record])
+            except Exception as e:
+                await self.handle_failure(record, e)
+                continue
+            exported += 1
+        logger.info(
+            f"Выгружено в таблицу по одному: {exported} из {len(records)}. "
+            f"{self.describe(await self.stats())}."
+        )
+        return exported
+
+    async def write(self, records: list[dict[str, any]]) -> None:
+        """
+        Записывает счета в таблицу. Добавление строк - точка фиксации: сразу после него счета
+        удаляются из очереди, а ошибка после добавления строк только записывается в лог.
+        """
+        row_ids = [record["id"] for record in records]
+        appended = False
+
+        async def mark_exported() -> None:
+            nonlocal appended
+            appended = True
+            self._exported.update(row_ids)
+            await self.forget_exported()
+
+        try:
+            await sheets_manager.add_payments_to_sheet(records, on_appended=mark_exported)
+        except Exception as e:
+            if not appended:
+                raise
+            logger.error(
+                f"Счета {row_ids} добавлены в таблицу, но после добавления произошла ошибка: {e}"
+            )
+
+    async def forget_exported(self) -> None:
+        """Удаляет из очереди счета, уже добавленные в таблицу."""
+        if self._exported:
+            row_ids = sorted(self._exported)
+            await db.delete_from_sheet_outbox(row_ids)
+            self._exported.difference_update(row_ids)
+
+    async def handle_failure(self, record: dict[str, any], error: Exception) -> None:
+        """Откладывает выгрузку счёта или прекращает её после max_attempts неудачных попыток."""
+        row_id, attempts = record["id"], record["attempts"] + 1
+        if attempts >= self.max_attempts:
+            await db.fail_sheet_outbox([row_id], str(error))
+            logger.error(
+                f"Выгрузка счёта №{row_id} в таблицу прекращена после {attempts} попыток, "
+                f"счёт нужно добавить в таблицу вручную: {error}"
+            )
+            return
+
+        delay = min(self.poll_interval * 2 ** record["attempts"], self.max_retry_delay)
+        await db.postpone_sheet_outbox([row_id], delay, str(error))
+        logger.error(
+            f"Не удалось выгрузить счёт №{row_id} в таблицу (попытка {attempts} из "
+            f"{self.max_attempts}), повтор через {delay} с: {error}"
+        )
+
+    async def stats(self) -> dict[str, any]:
+        """Размер очереди выгрузки, возраст самой старой записи в секундах и количество счетов, выгрузка которых прекращена."""
+        stats = await db.get_sheet_outbox_stats()
+        if stats["oldest_age"] is not None:
+            stats["oldest_age"] = round(stats["oldest_age"])
+        return stats
+
+    @staticmethod
+    def describe(stats: dict[str, any]) -> str:
+        if not stats["depth"]:
+            description = "Очередь выгрузки пуста"
+        else:
+            description = (
+                f"В очереди выгрузки: {stats['depth']}, самой старой записи {stats['oldest_age']} с"
+            )
+        if stats.get("failed"):
+            description += f", выгрузка прекращена: {stats['failed']}"
+        return description
+
+
+sheet_outbox = SheetOutbox()
+
+
+class SheetReconciler:
+    """
+    Периодическая сверка оплаченных счетов в базе данных с таблицей счетов в Google Sheets.
+
+    За один проход проверяются только решения об оплате, принятые после прошлой сверки,
+    и только строки таблицы, добавленные после позапрошлой: строки, дописанные в прошлый раз
+    между чтением базы данных и чтением таблицы, читаются повторно. Отметки хранятся в таблице 'meta'.
+    Решения о счетах, ещё ожидающих выгрузки, проверяются повторно при следующей сверке.
+    Счета, которых нет ни в таблице, ни в очереди выгрузки, записываются в лог и при requeue=True
+    снова ставятся в очередь выгрузки.
+    """
+
+    DECISION_KEY = "reconciled_decision_id"
+    SHEET_ROW_KEY = "reconciled_sheet_row"
+    PREVIOUS_SHEET_ROW_KEY = "reconciled_previous_sheet_row"
+
+    def __init__(
+        self,
+        interval: float = Config.sheet_reconcile_interval,
+        requeue: bool = Config.sheet_reconcile_requeue,
+    ):
+        self.interval = interval
+        self.requeue = requeue
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Запускает периодическую сверку."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Останавливает периодическую сверку."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Не удалось сверить оплаченные счета с таблицей: {e}")
+
+    async def reconcile(self) -> list[int]:
+        """Выполняет одну сверку и возвращает id счетов, не найденных в таблице."""
+        marks = await db.get_meta(
+            self.DECISION_KEY, self.SHEET_ROW_KEY, self.PREVIOUS_SHEET_ROW_KEY
+        )
+        if self.DECISION_KEY not in marks:
+            # счета, оплаченные до первой сверки, выгружались без id и не проверяются
+            await db.set_meta(
+                {
+                    self.DECISION_KEY: await db.get_max_decision_id(),
+                    self.SHEET_ROW_KEY: 0,
+                    self.PREVIOUS_SHEET_ROW_KEY: 0,
+                }
+            )
+            logger.info("Сверка с таблицей начнётся со следующих оплат.")
+            return []
+
+        # база данных читается раньше таблицы: если счёта уже нет в очереди выгрузки,
+        # то к моменту чтения таблицы он в неё записан
+        decisions = await db.get_paid_decisions(marks[self.DECISION_KEY])
+        in_outbox = await db.get_sheet_outbox_row_ids()
+        first_row = marks[self.PREVIOUS_SHEET_ROW_KEY] + 1
+        sheet_ids = await sheets_manager.get_record_ids(first_row)
+        last_row = first_row + len(sheet_ids) - 1
+        record_ids = set(sheet_ids)
+
+        missing = sorted(
+            {
+                row_id
+                for _, row_id in decisions
+                if row_id not in in_outbox and str(row_id) not in record_ids
+            }
+        )
+        # отметка не заходит за решения о счетах из очереди: они проверяются при следующей сверке
+        pending = [decision_id for decision_id, row_id in decisions if row_id in in_outbox]
+        if pending:
+            reconciled_id = pending[0] - 1
+        else:
+            reconciled_id = decisions[-1][0] if decisions else marks[self.DECISION_KEY]
+        if missing:
+            logger.warning(f"Оплаченные счета не найдены в таблице: {missing}")
+            if self.requeue:
+                await db.enqueue_sheet_export(missing)
+                sheet_outbox.notify()
+
+        await db.set_meta(
+            {
+                self.DECISION_KEY: reconciled_id,
+                self.PREVIOUS_SHEET_ROW_KEY: marks[self.SHEET_ROW_KEY],
+                self.SHEET_ROW_KEY: max(last_row, marks[self.SHEET_ROW_KEY]),
+            }
+        )
+        logger.info(
+            f"Сверка с таблицей: проверено оплат {len(decisions)}, "
+            f"строк таблицы {first_row}-{last_row}, не найдено счетов {len(missing)}."
+        )
+        return missing
+
+
+sheet_reconciler = SheetReconciler()
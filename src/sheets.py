@@ -1,14 +1,21 @@
+import asyncio
+from collections.abc import Awaitable, Callable
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
+from itertools import zip_longest
 
 import gspread_asyncio
-import pandas as pd
 import pytz
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
 from google.oauth2.service_account import Credentials
 
 from config.config import Config
 from config.logging_config import logger
 
+CATEGORY_COLUMNS = ("Статья", "Группа", "Партнер")
+# Столбец таблицы счетов с id счёта в базе данных (следующий после столбцов B:K с данными счёта)
+RECORD_ID_COLUMN = "L"
+
 
 async def get_today_moscow_time() -> str:
     """Функция для получения текущей даты"""
@@ -19,13 +26,6 @@ async def get_today_moscow_time() -> str:
     return formatted_date
 
 
-async def add_record_to_google_sheet(record_dict: dict) -> None:
-    """Функция для добавления строки в таблицу Google Sheet."""
-    manager = GoogleSheetsManager()
-    await manager.initialize_google_sheets()
-    await manager.add_payment_to_sheet(record_dict)
-
-
 def get_credentials() -> Credentials:
     """Функция для получения данных для авторизации в Google Sheets"""
 
@@ -41,7 +41,11 @@ def get_credentials() -> Credentials:
 
 
 class GoogleSheetsManager:
-    """Класс для обработки Google Sheets таблиц."""
+    """
+    Класс для обработки Google Sheets таблиц.
+    Создаётся один раз на всё приложение: авторизованный клиент, таблица и листы
+    кэшируются между вызовами, токен обновляется менеджером клиента до истечения срока.
+    """
 
     def __init__(self):
         self.sheets_spreadsheet_id = Config.google_sheets_spreadsheet_id
@@ -49,7 +53,21 @@ class GoogleSheetsManager:
         self.categories_sheet_id = Config.google_sheets_categories_sheet_id
         self.options_dict = None
         self.items = None
+        if Config.google_sheets_backend == "fake":
+            # заглушка нужна только для запуска без Google Sheets, поэтому импортируется здесь
+            from src.fake_sheets import create_fake_client_manager
+
+            self.agcm = create_fake_client_manager()
+        else:
+            self.agcm = gspread_asyncio.AsyncioGspreadClientManager(self.get_credentials)
         self.agc = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        self._categories = None
+        self._category_ranges = None
+        self._categories_modified_time = None
+        self._categories_lock = asyncio.Lock()
+        self._refresh_task = None
 
     @staticmethod
     def get_credentials() -> Credentials:
@@ -67,32 +85,130 @@ class GoogleSheetsManager:
         )
 
     async def initialize_google_sheets(self) -> gspread_asyncio.AsyncioGspreadClient:
-        """Инициализация в Google Sheets"""
+        """
+        Инициализация в Google Sheets.
+        Повторный вызов возвращает закэшированный клиент; после переавторизации
+        сохранённые таблица и листы сбрасываются и открываются заново новым клиентом.
+        """
 
         try:
-            agcm = gspread_asyncio.AsyncioGspreadClientManager(self.get_credentials)
-            self.agc = await agcm.authorize()
-            logger.info("Успешная авторизация Google Sheets.")
+            agc = await self.agcm.authorize()
+            if agc is not self.agc:
+                self.agc = agc
+                self._spreadsheet = None
+                self._worksheets.clear()
+                logger.info("Успешная авторизация Google Sheets.")
             return self.agc
         except Exception as e:
             logger.error(f"Авторизация не удалась: {e}")
             raise RuntimeError(f"Авторизация не удалась: {e}")
 
-    async def add_payment_to_sheet(self, payment_info: dict[str, str]) -> None:
-        """Добавить информацию о платеже в Google Sheets."""
+    async def get_spreadsheet(self) -> gspread_asyncio.AsyncioGspreadSpreadsheet:
+        """Получить таблицу, открыв её при первом обращении."""
+
+        await self.initialize_google_sheets()
+        if self._spreadsheet is None:
+            self._spreadsheet = await self.agc.open_by_key(self.sheets_spreadsheet_id)
+        return self._spreadsheet
+
+    async def get_worksheet(
+        self, sheet_id: int | str
+    ) -> gspread_asyncio.AsyncioGspreadWorksheet:
+        """Получить лист таблицы по id, открыв его при первом обращении."""
+
+        spreadsheet = await self.get_spreadsheet()
+        if sheet_id not in self._worksheets:
+            self._worksheets[sheet_id] = await spreadsheet.get_worksheet_by_id(
+                sheet_id
+            )
+        return self._worksheets[sheet_id]
+
+    async def get_modified_time(self) -> str:
+        """Получить время последнего изменения таблицы из метаданных Google Drive."""
+
+        spreadsheet = await self.get_spreadsheet()
+        # gspread_asyncio не оборачивает get_lastUpdateTime: синхронный метод gspread
+        # выполняется в отдельном потоке, чтобы не блокировать цикл событий
+        return await asyncio.to_thread(spreadsheet.ss.get_lastUpdateTime)
+
+    async def get_categories(
+        self,
+    ) -> tuple[dict[str, dict[str, list[str]]], list[str]]:
+        """Получить закэшированные категории; при первом обращении загрузить их из таблицы."""
+
+        if self._categories is None:
+            await self.reload_categories(force=True)
+        return self._categories
+
+    async def reload_categories(self, force: bool = False) -> bool:
+        """
+        Перечитать категории из таблицы, если она изменилась с последней загрузки.
+        При force=True категории перечитываются в любом случае.
+        Возвращает True, если категории были перечитаны.
+        """
+
+        async with self._categories_lock:
+            modified_time = await self.get_modified_time()
+            if (
+                not force
+                and self._categories is not None
+                and modified_time == self._categories_modified_time
+            ):
+                return False
+
+            self._categories = await self.get_data()
+            self._categories_modified_time = modified_time
+            logger.info(f"Категории обновлены, время изменения таблицы: {modified_time}")
+            return True
+
+    async def refresh_categories(self, interval: float) -> None:
+        """Фоновая задача: раз в interval секунд перечитывает категории, если таблица изменилась."""
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload_categories()
+            except Exception as e:
+                logger.error(f"Не удалось обновить категории: {e}")
+
+    def start_categories_refresh(self, interval: float) -> None:
+        """Запустить фоновое обновление категорий."""
+
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self.refresh_categories(interval))
+
+    async def stop_categories_refresh(self) -> None:
+        """Остановить фоновое обновление категорий."""
+
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def add_payments_to_sheet(
+        self,
+        payments: list[dict[str, str]],
+        on_appended: Callable[[], Awaitable[None]] | None = None,
+    ) -> None:
+        """
+        Добавить информацию о нескольких платежах в Google Sheets одной записью.
+        on_appended вызывается сразу после добавления строк, до остальных шагов.
+        """
 
         try:
-            spreadsheet = await self.agc.open_by_key(self.sheets_spreadsheet_id)
-            worksheet = await spreadsheet.get_worksheet_by_id(self.records_sheet_id)
-            all_data = await worksheet.get_all_values()
-            today_date = (
-                await get_today_moscow_time()
-            )  # Изменение: добавить await для асинхронной функции
-            rows_to_update = self.construct_rows(payment_info, today_date)
-            start_row = self.detect_start_row(all_data)
-
-            if rows_to_update:
-                await self.update_worksheet(worksheet, rows_to_update, start_row)
+            worksheet = await self.get_worksheet(self.records_sheet_id)
+            today_date = await get_today_moscow_time()
+            rows_to_append = [
+                row
+                for payment_info in payments
+                for row in self.construct_rows(payment_info, today_date)
+            ]
+
+            if rows_to_append:
+                await self.append_to_worksheet(worksheet, rows_to_append, on_appended)
 
         except Exception as e:
             logger.error(f"Не удалось добавить платеж в таблицу: {e}")
@@ -121,116 +237,141 @@ class GoogleSheetsManager:
                 payment_info["comment"],
                 month,
                 payment_info["payment_method"],
+                payment_info["id"],
             ]
             for month in period
         ]
 
-    async def update_worksheet(
-        self, worksheet, rows_to_update: list[list[str]], start_row: int
-    ) -> None:
-        """Обновить таблицу с новыми данными и применить форматирование."""
-
-        await worksheet.update(
-            f"B{start_row}:K{start_row + len(rows_to_update) - 1}",
-            rows_to_update,
+    async def append_to_worksheet(
+        self,
+        worksheet,
+        rows_to_append: list[list[str]],
+        on_appended: Callable[[], Awaitable[None]] | None = None,
+    ) -> str:
+        """
+        Дописать строки после последней заполненной строки столбцов B:L и применить форматирование.
+        Конец таблицы определяет сервер при записи, поэтому одновременные платежи
+        не перезаписывают строки друг друга. Ошибка форматирования только записывается в лог:
+        строки уже добавлены. Возвращает диапазон, в который записаны строки.
+        """
+
+        response = await worksheet.append_rows(
+            rows_to_append,
             value_input_option="USER_ENTERED",
+            table_range=f"B:{RECORD_ID_COLUMN}",
         )
-        logger.info(
-            f"Добавлено {len(rows_to_update)} row, начиная с строки {start_row}"
-        )
-
-        await self.apply_formatting(worksheet)
-
-    async def apply_formatting(self, worksheet) -> None:
-        """Применить необходимое форматирование к таблице."""
+        if on_appended is not None:
+            await on_appended()
+        updated_range = response["updates"]["updatedRange"]
+        logger.info(f"Добавлено {len(rows_to_append)} row в диапазон {updated_range}")
+
+        if not Config.google_sheets_format_once:
+            try:
+                first_cell, _, last_cell = updated_range.rsplit("!", 1)[-1].partition(":")
+                first_row = a1_to_rowcol(first_cell)[0]
+                last_row = a1_to_rowcol(last_cell or first_cell)[0]
+                await self.apply_formatting(worksheet, first_row, last_row)
+            except Exception as e:
+                logger.warning(f"Не удалось отформатировать строки {updated_range}: {e}")
+        return updated_range
+
+    async def apply_formatting(
+        self, worksheet, first_row: int | None = None, last_row: int | None = None
+    ) -> None:
+        """
+        Применить необходимое форматирование к таблице одним запросом batchUpdate.
+        Если указаны строки, форматируются только они, иначе - столбцы целиком.
+        """
 
         text_format = {"textFormat": {"fontFamily": "Lato"}}
         date_format = {"numberFormat": {"type": "DATE", "pattern": "dd.mm.yyyy"}}
         currency_format = {"numberFormat": {"type": "CURRENCY", "pattern": "₽ #,###"}}
 
-        await worksheet.format("B:I", text_format)
-        await worksheet.format("B3:B", date_format)
-        await worksheet.format("C3:C", currency_format)
-        await worksheet.format("J3:J", date_format)
-
-    def detect_start_row(self, all_data: list[list[str]]) -> int:
-        """Определить начальную строку для новых данных на основе существующих данных в таблице."""
-
-        return next(
-            (
-                index + 1
-                for index, row in enumerate(all_data)
-                if all(cell == "" for cell in row[:10])
-            ),
-            len(all_data) + 1,
+        if first_row is None:
+            text_range, first_row, last_row = "B:I", 3, ""
+        else:
+            text_range = f"B{first_row}:I{last_row}"
+
+        await worksheet.batch_format(
+            [
+                {"range": text_range, "format": text_format},
+                {"range": f"B{first_row}:B{last_row}", "format": date_format},
+                {"range": f"C{first_row}:C{last_row}", "format": currency_format},
+                {"range": f"J{first_row}:J{last_row}", "format": date_format},
+            ]
         )
 
+    async def get_record_ids(self, first_row: int) -> list[str]:
+        """
+        Прочитать id счетов из столбца RECORD_ID_COLUMN таблицы счетов, начиная со строки first_row.
+        Элемент списка соответствует строке first_row + индекс; для строк без id - пустая строка.
+        """
+
+        worksheet = await self.get_worksheet(self.records_sheet_id)
+        values = await worksheet.get(f"{RECORD_ID_COLUMN}{first_row}:{RECORD_ID_COLUMN}")
+        return [row[0] if row else "" for row in values]
+
     async def get_data(self) -> tuple[dict[str, dict[str, list[str]]], list[str]]:
         """Получить категории и соответствующих партнеров из Google Sheets."""
 
         try:
-            spreadsheet = await self.agc.open_by_key(self.sheets_spreadsheet_id)
-            worksheet = await spreadsheet.get_worksheet_by_id(self.categories_sheet_id)
-            records = await worksheet.get_all_records()
-            df = pd.DataFrame(records)
-            return self.construct_category_data(df)
+            worksheet = await self.get_worksheet(self.categories_sheet_id)
+            categories, groups, partners = await self.get_category_columns(worksheet)
+            return self.construct_category_data(categories, groups, partners)
         except Exception as e:
             logger.error(f"Не удалось прочитать данные категорий: {e}")
             raise RuntimeError(f"Не удалось прочитать данные категорий: {e}")
 
+    async def get_category_columns(self, worksheet) -> list[list[str]]:
+        """
+        Прочитать из листа "категории" только столбцы CATEGORY_COLUMNS (без заголовков).
+        Расположение столбцов запоминается по строке заголовков и определяется заново,
+        если заголовки в запомненных столбцах не совпадают.
+        """
+
+        if self._category_ranges is not None:
+            columns = await self.batch_get_columns(worksheet, self._category_ranges)
+            headers = [column[:1] for column in columns]
+            if headers == [[name] for name in CATEGORY_COLUMNS]:
+                return [column[1:] for column in columns]
+
+        header = await worksheet.row_values(1)
+        missing = [name for name in CATEGORY_COLUMNS if name not in header]
+        if missing:
+            raise RuntimeError(f"В таблице нет столбцов: {', '.join(missing)}")
+
+        ranges = []
+        for name in CATEGORY_COLUMNS:
+            letter = rowcol_to_a1(1, header.index(name) + 1)[:-1]
+            ranges.append(f"{letter}:{letter}")
+        self._category_ranges = ranges
+
+        columns = await self.batch_get_columns(worksheet, ranges)
+        return [column[1:] for column in columns]
+
+    @staticmethod
+    async def batch_get_columns(worksheet, ranges: list[str]) -> list[list[str]]:
+        """Прочитать столбцы одним запросом. Пустой столбец возвращается пустым списком."""
+
+        value_ranges = await worksheet.batch_get(ranges, major_dimension="COLUMNS")
+        return [value_range[0] if value_range else [] for value_range in value_ranges]
+
+    @staticmethod
     def construct_category_data(
-        self, df: pd.DataFrame
+        categories: list[str], groups: list[str], partners: list[str]
     ) -> tuple[dict[str, dict[str, list[str]]], list[str]]:
         """Организовать данные о категориях в структурированный словарь и список уникальных элементов."""
 
         data_structure = {}
-        unique_items = df["Статья"].unique().tolist()
-        logger.info(unique_items)
-        for _, row in df.iterrows():
-            category = row["Статья"]
-            group = row["Группа"]
-            partner = row["Партнер"]
-
-            if category not in data_structure:
-                data_structure[category] = {}
-
-            if group not in data_structure[category]:
-                data_structure[category][group] = []
-
-            data_structure[category][group].append(partner)
+        for row in zip_longest(categories, groups, partners, fillvalue=""):
+            if not any(row):
+                continue
+            category, group, partner = row
+            data_structure.setdefault(category, {}).setdefault(group, []).append(partner)
 
+        unique_items = list(data_structure)
+        logger.info(unique_items)
         return data_structure, unique_items
 
-    # async def get_data(self) -> tuple[dict[str, dict[str, list[str]]], list[str]]:
-    #     """
-    #     Получение списка статей и списка словарей данных из таблицы "категории"
-    #     """
-    #
-    #     try:
-    #         spreadsheet = await self.agc.open_by_key(self.sheets_spreadsheet_id)
-    #         worksheet = await spreadsheet.get_worksheet_by_id(self.categories_sheet_id)
-    #     except Exception as e:
-    #         raise RuntimeError(
-    #             f'Ошибка получения данных с листа "категории". Ошибка: {e}'
-    #         )
-    #
-    #     df = pd.DataFrame(await worksheet.get_all_records())
-    #     unique_items = df["Статья"].unique()
-    #     data_structure = {}
-    #
-    #     for _, row in df.iterrows():
-    #         category = row["Статья"]
-    #         group = row["Группа"]
-    #         partner = row["Партнер"]
-    #
-    #         if category not in data_structure:
-    #             data_structure[category] = {}
-    #
-    #         if group not in data_structure[category]:
-    #             data_structure[category][group] = []
-    #
-    #         data_structure[category][group].append(partner)
-    #
-    #     self.options_dict, self.items = data_structure, unique_items
-    #
-    #     return data_structure, unique_items
+
+sheets_manager = GoogleSheetsManager()
@@ -0,0 +1,146 @@
+import asyncio
+import hmac
+import secrets
+import signal
+from json import JSONDecodeError
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from config.config import Config
+from config.logging_config import log_queue_handler, logger
+from helper.message_manager import message_manager
+from helper.rate_limiter import TelegramRateLimiter
+from src.sheet_outbox import sheet_outbox
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    HTTP-сервер для приёма обновлений от Telegram через вебхук.
+
+    Обновления с верным секретным токеном кладутся в очередь приложения сразу после получения
+    и обрабатываются параллельно (не более Config.telegram_concurrent_updates одновременно).
+    По адресу health_path сервер отвечает состоянием бота для проверок обратного прокси.
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        url: str = Config.telegram_webhook_url,
+        listen: str = Config.telegram_webhook_listen,
+        port: int = Config.telegram_webhook_port,
+        path: str = Config.telegram_webhook_path,
+        secret_token: str | None = Config.telegram_webhook_secret_token,
+        health_path: str = Config.telegram_webhook_health_path,
+    ):
+        if not url:
+            raise RuntimeError("Не задан адрес вебхука TELEGRAM_WEBHOOK_URL")
+        if not secret_token:
+            # вебхук регистрирует сам бот, поэтому токен можно сгенерировать при запуске
+            secret_token = secrets.token_urlsafe(32)
+            logger.warning(
+                "TELEGRAM_WEBHOOK_SECRET_TOKEN не задан, используется случайный токен."
+            )
+        self.application = application
+        self.url = url
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.health_path = health_path
+        self._runner: web.AppRunner | None = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.telegram_update)
+        app.router.add_get(self.health_path, self.health)
+        return app
+
+    async def telegram_update(self, request: web.Request) -> web.Response:
+        """Принимает обновление от Telegram и ставит его в очередь обработки."""
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            logger.warning(f"Запрос к вебхуку с неверным секретным токеном от {request.remote}")
+            return web.Response(status=403)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except (JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"Не удалось разобрать обновление, полученное через вебхук: {e}")
+            return web.Response(status=400)
+
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        """
+        Состояние бота: работает ли приложение, размер очереди обновлений,
+        количество пропущенных записей лога, счётчики кэша данных счетов, количество запросов
+        к Telegram, ожидающих ограничителя частоты, и очередь выгрузки в таблицу.
+        """
+        status = {
+            "status": "ok" if self.application.running else "stopped",
+            "update_queue": self.application.update_queue.qsize(),
+            "log_dropped": log_queue_handler.dropped,
+            "message_cache": message_manager.cache_stats(),
+        }
+        rate_limiter = self.application.bot.rate_limiter
+        if isinstance(rate_limiter, TelegramRateLimiter):
+            status["rate_limiter_queue"] = rate_limiter.queue_depth
+        try:
+            status["sheet_outbox"] = await sheet_outbox.stats()
+        except Exception as e:
+            status["sheet_outbox"] = {"error": str(e)}
+        return web.json_response(status, status=200 if self.application.running else 503)
+
+    async def start(self) -> None:
+        """Запускает приложение, регистрирует вебхук в Telegram и начинает принимать запросы."""
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=self.url,
+            allowed_updates=Update.ALL_TYPES,
+            secret_token=self.secret_token,
+            max_connections=min(max(Config.telegram_concurrent_updates, 1), 100),
+        )
+        await application.start()
+
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"Вебхук {self.url} принимает обновления на {self.listen}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        """Прекращает приём запросов, дожидается обработки полученных обновлений и останавливает приложение."""
+        application = self.application
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if application.running:
+            await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+
+    async def run(self) -> None:
+        """Работает до получения SIGINT или SIGTERM."""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        try:
+            await self.start()
+            await stop_event.wait()
+        finally:
+            await self.stop()
+
+
+def run_webhook(application: Application) -> None:
+    """Запускает бота в режиме вебхука."""
+    asyncio.run(WebhookServer(application).run())
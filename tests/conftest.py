@@ -0,0 +1,16 @@
+import os
+
+# Config читает обязательные переменные окружения при импорте
+for name, value in {
+    "TELEGRAM_BOT_TOKEN": "123456:test",
+    "HEAD_CHAT_IDS": "1",
+    "FINANCE_CHAT_IDS": "2",
+    "PAYMENT_CHAT_IDS": "3",
+    "INITIATOR_CHAT_IDS": "4",
+    "WHITE_LIST": "1,2,3,4",
+    "GOOGLE_SHEETS_BACKEND": "fake",
+    "GOOGLE_SHEETS_SPREADSHEET_ID": "test",
+    "GOOGLE_SHEETS_RECORDS_SHEET_ID": "0",
+    "GOOGLE_SHEETS_CATEGORIES_SHEET_ID": "1",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,85 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from db.db import (
+    COUNT_NOT_PAID_QUERY,
+    NOT_PAID_NEXT_QUERY,
+    NOT_PAID_PREVIOUS_QUERY,
+    ApprovalDB,
+)
+from db.migrations import MIGRATIONS
+
+
+@pytest.fixture
+def migrated_db(tmp_path) -> str:
+    """Файл базы данных, приведённой к последней версии схемы."""
+
+    async def migrate() -> None:
+        db = ApprovalDB(write_behind=False)
+        db.db_file = str(db_file)
+        await db.migrate()
+        await db.close()
+
+    db_file = tmp_path / "approvals.db"
+    asyncio.run(migrate())
+    return str(db_file)
+
+
+def query_plan(db_file: str, query: str, parameters: tuple = ()) -> str:
+    with sqlite3.connect(db_file) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", parameters).fetchall()
+    return "\n".join(detail for *_, detail in rows)
+
+
+def test_migrate_sets_user_version(migrated_db):
+    with sqlite3.connect(migrated_db) as conn:
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+    assert version == len(MIGRATIONS)
+
+
+def test_migrate_is_idempotent(migrated_db):
+    async def migrate_again() -> None:
+        db = ApprovalDB(write_behind=False)
+        db.db_file = migrated_db
+        await db.migrate()
+        await db.close()
+
+    asyncio.run(migrate_again())
+    with sqlite3.connect(migrated_db) as conn:
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+    assert version == len(MIGRATIONS)
+
+
+def test_count_not_paid_uses_open_index(migrated_db):
+    plan = query_plan(migrated_db, COUNT_NOT_PAID_QUERY)
+    assert "USING INDEX idx_approvals_open" in plan
+    assert "idx_approvals_status" not in plan
+
+
+@pytest.mark.parametrize("query", [NOT_PAID_NEXT_QUERY, NOT_PAID_PREVIOUS_QUERY])
+def test_find_not_paid_uses_open_index(migrated_db, query):
+    plan = query_plan(migrated_db, query, (0, 10))
+    assert "idx_approvals_open" in plan
+    assert "SCAN approvals" not in plan
+
+
+def test_not_paid_queries_run_without_open_index(migrated_db):
+    async def query_without_index() -> tuple[int, list]:
+        db = ApprovalDB(write_behind=False)
+        db.db_file = migrated_db
+        await db.connect()
+        try:
+            return await db.count_not_paid(), await db.find_not_paid(limit=10)
+        finally:
+            await db.close()
+
+    with sqlite3.connect(migrated_db) as conn:
+        conn.execute("DROP INDEX idx_approvals_open")
+    assert asyncio.run(query_without_index()) == (0, [])
+
+
+def test_initiator_lookup_uses_initiator_index(migrated_db):
+    plan = query_plan(migrated_db, "SELECT * FROM approvals WHERE initiator_id = ?", (4,))
+    assert "idx_approvals_initiator_id" in plan
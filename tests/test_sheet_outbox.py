@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from db import db
+from src.fake_sheets import DEFAULT_RECORDS, FakeWorksheet
+from src.sheet_outbox import SheetOutbox, SheetReconciler
+from src.sheets import sheets_manager
+
+RECORD = {
+    "amount": 1000,
+    "expense_item": "Статья",
+    "expense_group": "Группа",
+    "partner": "Партнёр",
+    "comment": "Комментарий",
+    "period": "09.24",
+    "payment_method": "Карта",
+    "approvals_needed": 1,
+    "approvals_received": 1,
+    "status": "Approved",
+    "approved_by": None,
+    "initiator_id": 4,
+}
+
+
+@pytest.fixture
+def outbox_db(tmp_path):
+    """База данных с двумя оплаченными счетами в очереди выгрузки и пустая таблица счетов."""
+
+    async def prepare() -> None:
+        await db.migrate()
+        for _ in range(2):
+            row_id = await db.insert_record(dict(RECORD))
+            await db.transition(
+                row_id,
+                "Approved",
+                "Paid",
+                department="payment",
+                chat_id=3,
+                decision="paid",
+                export_to_sheet=True,
+            )
+
+    db.db_file = str(tmp_path / "approvals.db")
+    sheets_manager.agcm.backend.sheets[str(sheets_manager.records_sheet_id)] = [
+        list(row) for row in DEFAULT_RECORDS
+    ]
+    asyncio.run(prepare())
+    yield
+    asyncio.run(db.close())
+
+
+def export(passes: int) -> tuple[list[str], dict[str, any]]:
+    """Несколько проходов выгрузки: id счетов в таблице и состояние очереди."""
+
+    async def run() -> tuple[list[str], dict[str, any]]:
+        outbox = SheetOutbox(batch_size=10, poll_interval=0, max_retry_delay=0, max_attempts=3)
+        for _ in range(passes):
+            await outbox.export_batch()
+        return await sheets_manager.get_record_ids(len(DEFAULT_RECORDS) + 1), await outbox.stats()
+
+    return asyncio.run(run())
+
+
+def test_export_writes_each_record_once(outbox_db):
+    record_ids, stats = export(passes=3)
+    assert record_ids == ["1", "2"]
+    assert stats["depth"] == 0
+
+
+def test_formatting_error_does_not_repeat_append(outbox_db, monkeypatch):
+    async def batch_format(self, formats):
+        raise RuntimeError("formatting failed")
+
+    monkeypatch.setattr(FakeWorksheet, "batch_format", batch_format)
+    record_ids, stats = export(passes=3)
+    assert record_ids == ["1", "2"]
+    assert stats["depth"] == 0
+
+
+def test_error_after_append_does_not_repeat_append(outbox_db, monkeypatch):
+    delete_from_sheet_outbox = db.delete_from_sheet_outbox
+    failures = iter([RuntimeError("database is locked")])
+
+    async def fail_once(row_ids):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        await delete_from_sheet_outbox(row_ids)
+
+    monkeypatch.setattr(db, "delete_from_sheet_outbox", fail_once)
+    record_ids, stats = export(passes=3)
+    assert record_ids == ["1", "2"]
+    assert stats == {"depth": 0, "oldest_age": None, "failed": 0}
+
+
+def test_reconcile_rechecks_decisions_waiting_in_outbox(outbox_db):
+    async def run() -> list[tuple[list[int], int]]:
+        await db.set_meta(
+            {
+                SheetReconciler.DECISION_KEY: 0,
+                SheetReconciler.SHEET_ROW_KEY: 0,
+                SheetReconciler.PREVIOUS_SHEET_ROW_KEY: 0,
+            }
+        )
+        outbox = SheetOutbox(batch_size=10, poll_interval=0, max_retry_delay=0, max_attempts=3)
+        reconciler = SheetReconciler(interval=0, requeue=False)
+        results = []
+        # первый счёт ещё в очереди, второй уже выгружен
+        first, second = await db.get_sheet_outbox(10)
+        await outbox.write([second])
+        for _ in range(2):
+            missing = await reconciler.reconcile()
+            marks = await db.get_meta(SheetReconciler.DECISION_KEY)
+            results.append((missing, marks[SheetReconciler.DECISION_KEY]))
+            await outbox.export_batch()
+        await db.delete_from_sheet_outbox([first["id"]])
+        return results
+
+    assert asyncio.run(run()) == [([], 0), ([], 2)]